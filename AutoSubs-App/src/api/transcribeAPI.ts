@@ -26,6 +26,11 @@ export async function fetchTranscription(audioInfo: AudioInfo, outputDir: string
     textFormat: options.textFormat,
     maxWords: options.maxWords,
     maxChars: options.maxChars,
+    // Per-segment "[mm:ss.xxx --> mm:ss.xxx] text" lines feed the live subtitle preview
+    verbose: true,
+    // Timelines over the server's threshold (10 minutes) are transcribed in
+    // checkpointed chunks, so running the same job again after a crash resumes it
+    checkpoint: true,
   };
   const response = await fetch(transcribeAPI, {
     method: 'POST',
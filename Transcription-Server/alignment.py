@@ -0,0 +1,70 @@
+"""
+Word alignment after transcription, in one pass over the decoded audio.
+
+The aligner only reads the audio inside each segment, so the transcript is
+cut at silences between segments into chunks that are aligned
+independently (on slices of the same decoded samples) by a few threads.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logger import get_logger
+
+log = get_logger("align")
+
+SAMPLE_RATE = 16000
+
+# Silence between two segments that may end a chunk (seconds)
+MIN_GAP = 1.0
+# Chunks shorter than this are not cut, the per-chunk setup is not free
+MIN_CHUNK = 30.0
+ALIGN_WORKERS = int(os.environ.get("AUTOSUBS_ALIGN_WORKERS", "2"))
+
+
+def silence_chunks(segments, min_gap=MIN_GAP, min_chunk=MIN_CHUNK):
+    """Split segment dicts into runs that are separated by at least min_gap of silence."""
+    chunks = []
+    current = []
+    for segment in segments:
+        if current and segment["start"] - current[-1]["end"] >= min_gap \
+                and current[-1]["end"] - current[0]["start"] >= min_chunk:
+            chunks.append(current)
+            current = []
+        current.append(segment)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _align_chunk(model, audio, chunk, language, options):
+    # Align on the chunk's slice of the audio with times relative to it
+    offset = chunk[0]["start"]
+    first = int(offset * SAMPLE_RATE)
+    last = min(len(audio), int(round(chunk[-1]["end"] * SAMPLE_RATE)) + 1)
+    part = [{"start": s["start"] - offset, "end": s["end"] - offset, "text": s["text"]} for s in chunk]
+    aligned = model.align_words(audio[first:last], part, language, **options)
+    aligned.offset_time(offset)
+    return aligned.segments_to_dicts()
+
+
+def align_result(model, audio, result, language, workers=ALIGN_WORKERS, **options):
+    """
+    Word timestamps for every segment of result, aligned chunk by chunk on
+    up to `workers` threads. Returns a new WhisperResult and the seconds spent.
+    """
+    import stable_whisper
+
+    start = time.time()
+    chunks = silence_chunks(result.segments_to_dicts())
+    workers = max(1, min(workers, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="align") as pool:
+        parts = list(pool.map(lambda chunk: _align_chunk(model, audio, chunk, language, options), chunks))
+    aligned = stable_whisper.WhisperResult({
+        "segments": [segment for part in parts for segment in part],
+        "language": result.language,
+    })
+    elapsed = time.time() - start
+    log.info(f"Aligned {len(aligned.segments)} segments in {len(chunks)} chunks "
+             f"({workers} threads) in {elapsed:.1f}s")
+    return aligned, elapsed
@@ -0,0 +1,36 @@
+import subprocess
+import wave
+
+import numpy as np
+
+
+def get_audio_duration(path):
+    """Duration of an audio file in seconds (0.0 if it cannot be determined)."""
+    try:
+        with wave.open(path, "rb") as f:
+            return f.getnframes() / float(f.getframerate())
+    except Exception:
+        pass
+
+    # Not a plain PCM WAV, ask ffprobe (shipped next to ffmpeg)
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", path],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return float(out.strip())
+    except Exception:
+        return 0.0
+
+
+
+def decode_audio(path, sample_rate=16000):
+    """Decode a file to mono float32 samples at sample_rate, the input every model takes."""
+    # Same ffmpeg invocation as stable-ts, so results match decoding the path
+    out = subprocess.run(
+        ["ffmpeg", "-nostdin", "-threads", "0", "-i", path, "-f", "s16le",
+         "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-"],
+        capture_output=True, check=True,
+    ).stdout
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
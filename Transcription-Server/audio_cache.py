@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+import uuid
+
+import numpy as np
+
+from audio import decode_audio
+from logger import get_logger
+
+log = get_logger("audio")
+
+
+class AudioCache(object):
+    """
+    Decoded 16 kHz mono float32 audio stored as .npy files, keyed by source
+    path, mtime and size. Hits are memory-mapped, so a retry of the same
+    file skips ffmpeg and only the pages that are read get loaded.
+    The directory is kept under max_bytes by evicting the least recently
+    used files, except the pinned ones a reader was promised (store(pin=True))
+    and has not mapped yet.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # path -> readers it was handed to and not released yet
+        self.pinned = {}
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def path_for(self, source):
+        stat = os.stat(source)
+        ident = f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}"
+        return os.path.join(self.directory, hashlib.sha1(ident.encode("utf-8")).hexdigest() + ".npy")
+
+    def _pin(self, path):
+        self.pinned[path] = self.pinned.get(path, 0) + 1
+
+    def unpin(self, path):
+        """Let path be evicted again, once the reader store(pin=True) was for is done."""
+        with self.lock:
+            count = self.pinned.pop(path, 0) - 1
+            if count > 0:
+                self.pinned[path] = count
+
+    def store(self, source, pin=False):
+        """
+        Path of the cached .npy for source, decoding it first on a miss.
+        With pin it is not evicted until unpin(path).
+        """
+        path = self.path_for(source)
+        # Checked under the lock, so eviction cannot remove it before the pin
+        with self.lock:
+            if os.path.exists(path):
+                # mtime is the recency used for eviction
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                self.hits += 1
+                if pin:
+                    self._pin(path)
+                return path
+
+        samples = decode_audio(source)
+        # Unique temporary name, two jobs may decode the same file at once
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, samples)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.misses += 1
+            if pin:
+                self._pin(path)
+        self.evict(keep=path)
+        return path
+
+    def load(self, source):
+        """Decoded samples of source, memory-mapped from the cache."""
+        if not self.enabled:
+            return decode_audio(source)
+        # Copy-on-write mapping: readers that modify the samples get private
+        # pages and the cache file stays intact. Handed out as a plain
+        # ndarray view, stable-ts only accepts exact ndarray types
+        return np.load(self.store(source), mmap_mode="c").view(np.ndarray)
+
+    def evict(self, keep=None):
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith(".tmp"):
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep or path in self.pinned:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Still mapped by a reader (Windows), try again next time
+                    continue
+                total -= size
+                log.debug(f"Evicted {path} from the audio cache")
+
+    def stats(self):
+        with self.lock:
+            files = [os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(".npy")]
+            size = sum(os.path.getsize(p) for p in files if os.path.exists(p))
+            return {"files": len(files), "size_mb": round(size / 1024 / 1024, 1),
+                    "max_mb": round(self.max_bytes / 1024 / 1024, 1), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import platform
+import threading
+import time
+
+import numpy as np
+
+from file_lock import update_json
+from logger import get_logger
+
+log = get_logger("calibration")
+
+SAMPLE_RATE = 16000
+
+# How often background calibration checks whether jobs are running (seconds)
+IDLE_POLL = 5.0
+
+
+def host_key():
+    """Identifies this machine, so a copied cache never applies another host's settings."""
+    ident = "|".join([platform.node(), platform.machine(), platform.processor(), str(os.cpu_count())])
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()[:16]
+
+
+def reference_clip(seconds=30, seed=0):
+    """
+    Deterministic speech-like clip: voiced harmonics with a syllable-rate
+    envelope. Every candidate decodes the same input, so only speed differs.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    audio = 0.1 * voiced * envelope + 0.005 * rng.standard_normal(t.shape)
+    return audio.astype(np.float32)
+
+
+def thread_candidates(cpu_count):
+    candidates = {cpu_count, max(1, cpu_count // 2), max(1, cpu_count // 4), min(4, cpu_count), min(8, cpu_count)}
+    return sorted(candidates)
+
+
+def compute_type_candidates():
+    import ctranslate2
+    supported = ctranslate2.get_supported_compute_types("cpu")
+    return [c for c in ("int8", "int8_float32", "int16", "float32") if c in supported]
+
+
+class Calibration(object):
+    """
+    Per-host CPU settings (compute_type, cpu_threads, num_workers) for each
+    faster-whisper model, measured on a short reference clip and stored as
+    JSON under the cache directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.host = host_key()
+        self.lock = threading.Lock()
+        self.running = set()
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get(self.host, {})
+        except (OSError, ValueError):
+            return {}
+
+    def _store(self, model_name, entry):
+        # Other hosts and other worker processes write the same file
+        data = update_json(self.path, lambda data: data.setdefault(self.host, {}).update({model_name: entry}))
+        self.entries = data[self.host]
+
+    def get(self, model_name):
+        with self.lock:
+            return self.entries.get(model_name)
+
+    def _time_decode(self, model, clip, streams=1):
+        """Wall time to decode the clip once per stream, streams running concurrently."""
+        def decode():
+            segments, _ = model.transcribe(
+                clip, language="en", beam_size=1, temperature=0.0, vad_filter=False,
+                condition_on_previous_text=False, without_timestamps=True)
+            for _ in segments:
+                pass
+
+        threads = [threading.Thread(target=decode) for _ in range(streams)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def _trial(self, model_name, clip, compute_type, cpu_threads, num_workers, trials, budget=None, when_idle=False):
+        if budget is None:
+            return self._run_trial(model_name, clip, compute_type, cpu_threads, num_workers, trials)
+        if when_idle:
+            # Background calibration only measures an idle machine, and a
+            # job that arrives waits for one trial at most
+            while not budget.idle():
+                time.sleep(IDLE_POLL)
+        with budget.lease("calibrate", desired=budget.total):
+            return self._run_trial(model_name, clip, compute_type, cpu_threads, num_workers, trials)
+
+    def _run_trial(self, model_name, clip, compute_type, cpu_threads, num_workers, trials):
+        from faster_whisper import WhisperModel
+        model = WhisperModel(model_name, device="cpu", compute_type=compute_type,
+                             cpu_threads=cpu_threads, num_workers=num_workers)
+        # First decode pays for allocations and caches, keep it out of the result
+        self._time_decode(model, clip[:SAMPLE_RATE * 5])
+        elapsed = self._time_decode(model, clip, streams=num_workers)
+        trial = {
+            "compute_type": compute_type,
+            "cpu_threads": cpu_threads,
+            "num_workers": num_workers,
+            "seconds": round(elapsed, 4),
+            # clips decoded per second, the figure of merit for every stage
+            "throughput": round(num_workers / elapsed, 4),
+        }
+        log.info(f"Calibration {model_name}: {trial}")
+        trials.append(trial)
+        del model
+        return trial
+
+    def calibrate(self, model_name, clip=None, budget=None, when_idle=False):
+        """
+        Measure the fastest CPU settings for a model:
+        1. compute type at full thread count,
+        2. intra-op thread count for a single stream,
+        3. number of concurrent workers sharing the cores.
+        Each trial holds a lease on all cores of budget (a CpuBudget) if one
+        is given, and with when_idle waits until no other lease is held.
+        """
+        clip = reference_clip() if clip is None else clip
+        cpu_count = budget.total if budget is not None else os.cpu_count() or 1
+        trials = []
+        start = time.time()
+
+        def trial(compute_type, threads, workers):
+            return self._trial(model_name, clip, compute_type, threads, workers, trials, budget, when_idle)
+
+        best = max((trial(c, cpu_count, 1) for c in compute_type_candidates()), key=lambda t: t["throughput"])
+        compute_type = best["compute_type"]
+
+        for threads in thread_candidates(cpu_count):
+            if threads != best["cpu_threads"]:
+                trial_result = trial(compute_type, threads, 1)
+                if trial_result["throughput"] > best["throughput"]:
+                    best = trial_result
+        single = best
+
+        for workers in (2, 4):
+            if cpu_count // workers >= 1:
+                trial_result = trial(compute_type, max(1, cpu_count // workers), workers)
+                if trial_result["throughput"] > best["throughput"]:
+                    best = trial_result
+
+        entry = {
+            "compute_type": compute_type,
+            # single request latency
+            "cpu_threads": single["cpu_threads"],
+            # best throughput when several items share the model
+            "num_workers": best["num_workers"],
+            "worker_threads": best["cpu_threads"],
+            "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration": round(time.time() - start, 1),
+            "trials": trials,
+        }
+        with self.lock:
+            self._store(model_name, entry)
+        log.info(f"Calibrated {model_name}: compute_type={compute_type}, cpu_threads={entry['cpu_threads']}, "
+                 f"num_workers={entry['num_workers']}")
+        return entry
+
+    def calibrate_in_background(self, model_name, budget=None):
+        """
+        Start calibrating a model unless it is done or already running. Its
+        trials only run while budget has no other leases (no job running).
+        """
+        with self.lock:
+            if model_name in self.entries or model_name in self.running:
+                return False
+            self.running.add(model_name)
+
+        def run():
+            try:
+                self.calibrate(model_name, budget=budget, when_idle=True)
+            except Exception as e:
+                log.warning(f"Calibration of {model_name} failed: {e}")
+            finally:
+                with self.lock:
+                    self.running.discard(model_name)
+
+        threading.Thread(target=run, name=f"calibrate-{model_name}", daemon=True).start()
+        return True
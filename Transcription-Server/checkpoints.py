@@ -0,0 +1,171 @@
+"""
+Checkpoints of long transcriptions, so a job that dies with the server can
+be submitted again and resume where it stopped instead of starting over.
+
+Files longer than CHECKPOINT_MIN_SECONDS get a checkpoint. On request
+(checkpoint=true, which the AutoSubs app sends) they are transcribed in
+chunks of about CHUNK_SECONDS, each cut at the quietest moment near its end.
+The decoder does not see across a cut beyond the prompt of the text before
+it, so API callers can leave it off and get one chunk of the whole file.
+The segments of every finished chunk, and the diarization once it is done,
+are written to one JSON file per job. Its key covers the audio content and
+every setting that changes the decoded text, so only the same job picks it
+up again.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from logger import get_logger
+
+log = get_logger("checkpoints")
+
+SAMPLE_RATE = 16000
+
+CHECKPOINT_MIN_SECONDS = float(os.environ.get("AUTOSUBS_CHECKPOINT_MIN_SECONDS", "600"))
+CHUNK_SECONDS = float(os.environ.get("AUTOSUBS_CHECKPOINT_CHUNK_SECONDS", "300"))
+# A chunk ends at the quietest 100 ms within this far of its target length
+SEARCH_SECONDS = 10.0
+# Checkpoints of jobs nobody submitted again are dropped after a week
+CHECKPOINT_TTL = 7 * 24 * 3600.0
+
+
+def checkpoint_key(audio_digest, settings):
+    data = json.dumps([audio_digest, settings], sort_keys=True)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def chunk_bounds(audio, chunk_seconds=CHUNK_SECONDS, search_seconds=SEARCH_SECONDS):
+    """(start, end) seconds of chunks of about chunk_seconds covering the audio."""
+    frame = SAMPLE_RATE // 10
+    total = len(audio)
+    chunk = int(chunk_seconds * SAMPLE_RATE)
+    search = int(search_seconds * SAMPLE_RATE)
+    bounds = []
+    start = 0
+    # The last chunk takes the rest rather than leaving a sliver
+    while total - start > chunk + search:
+        low = max(start, start + chunk - search)
+        frames = (start + chunk + search - low) // frame
+        region = np.asarray(audio[low:low + frames * frame], dtype=np.float32).reshape(frames, frame)
+        cut = low + int(np.argmin((region ** 2).mean(axis=1))) * frame + frame // 2
+        bounds.append((start / SAMPLE_RATE, cut / SAMPLE_RATE))
+        start = cut
+    bounds.append((start / SAMPLE_RATE, total / SAMPLE_RATE))
+    return bounds
+
+
+def diarization_turns(diarization):
+    """pyannote Annotation as [start, end, speaker] lists."""
+    return [[turn.start, turn.end, speaker] for turn, _, speaker in diarization.itertracks(yield_label=True)]
+
+
+def restore_diarization(turns):
+    from pyannote.core import Annotation, Segment
+    diarization = Annotation()
+    for index, (start, end, speaker) in enumerate(turns):
+        diarization[Segment(start, end), index] = speaker
+    return diarization
+
+
+class Checkpoint(object):
+    """Progress of one job: the segments of its finished chunks and its diarization."""
+
+    def __init__(self, store, key, data):
+        self.store = store
+        self.key = key
+        self.data = data
+        self.lock = threading.Lock()
+        # chunks already done when the job was submitted
+        self.resumed = sum(1 for chunk in data["chunks"] if chunk is not None)
+
+    @property
+    def bounds(self):
+        return [tuple(bound) for bound in self.data["bounds"]]
+
+    def chunk(self, index):
+        return self.data["chunks"][index]
+
+    def save_chunk(self, index, segments, language):
+        with self.lock:
+            self.data["chunks"][index] = {"segments": segments, "language": language}
+            self.store.save(self)
+
+    def diarization(self, speaker_count):
+        entry = self.data.get("diarization")
+        if entry is None or entry["speaker_count"] != speaker_count:
+            return None
+        return entry["turns"]
+
+    def save_diarization(self, speaker_count, turns):
+        with self.lock:
+            self.data["diarization"] = {"speaker_count": speaker_count, "turns": turns}
+            self.store.save(self)
+
+
+class CheckpointStore(object):
+    """One JSON file per job under directory."""
+
+    def __init__(self, directory, ttl=CHECKPOINT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def open(self, key, bounds, settings):
+        """The checkpoint of a job, resumed from its file if there is one."""
+        self.expire()
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        bounds = [list(bound) for bound in bounds]
+        if data is not None and data["bounds"] != bounds:
+            # Chunked differently (another chunk size), only diarization carries over
+            data = dict(data, bounds=bounds, chunks=[None] * len(bounds))
+        if data is None:
+            data = {"settings": settings, "bounds": bounds, "chunks": [None] * len(bounds),
+                    "diarization": None, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        checkpoint = Checkpoint(self, key, data)
+        if checkpoint.resumed or data["diarization"] is not None:
+            log.info(f"Resuming from checkpoint {key}: {checkpoint.resumed}/{len(bounds)} chunks done"
+                     + (", diarization done" if data["diarization"] is not None else ""))
+        return checkpoint
+
+    def save(self, checkpoint):
+        checkpoint.data["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        path = self._path(checkpoint.key)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(checkpoint.data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning(f"Could not save checkpoint {checkpoint.key}: {e}")
+
+    def remove(self, checkpoint):
+        try:
+            os.remove(self._path(checkpoint.key))
+        except OSError:
+            pass
+
+    def expire(self):
+        now = time.time()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
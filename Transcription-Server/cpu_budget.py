@@ -0,0 +1,145 @@
+import contextlib
+import itertools
+import os
+import threading
+
+from logger import get_logger
+
+log = get_logger("cpu")
+
+
+class Lease(object):
+    def __init__(self, lease_id, stage, job_id, weight, desired, elastic):
+        self.id = lease_id
+        self.stage = stage
+        self.job_id = job_id
+        self.weight = weight
+        self.desired = desired
+        # Elastic leases (torch) can be resized while running, fixed ones
+        # (ctranslate2, threads chosen at model load) keep what they got
+        self.elastic = elastic
+        self.threads = 0
+
+    def to_dict(self):
+        return {"stage": self.stage, "job": self.job_id, "threads": self.threads,
+                "weight": self.weight, "elastic": self.elastic}
+
+
+class CpuBudget(object):
+    """
+    Splits the machine's cores between the stages that run at the same time
+    (transcription, diarization, several batch items), so torch and
+    ctranslate2 do not each spawn a thread per core and oversubscribe.
+
+    Every running stage holds a lease. Fixed leases (ctranslate2) get exactly
+    the threads they ask for, because the count is baked into the model when
+    it is loaded and ends up in the model cache key: a model is always loaded
+    with the same count, and concurrency is capped instead, a fixed lease
+    waits until the other fixed leases leave it room. Elastic leases (torch)
+    share what the fixed ones leave and are resized whenever a lease is
+    acquired or released; listeners are told so they can apply the new counts.
+
+    A fixed lease that does not ask for a count gets every core, or, with
+    elastic leases registered (diarization next to transcription), leaves
+    them their fair share.
+    """
+
+    def __init__(self, total=None):
+        self.total = total or os.cpu_count() or 1
+        self.lock = threading.Lock()
+        self.freed = threading.Condition(self.lock)
+        self.leases = {}
+        self.ids = itertools.count(1)
+        self.listeners = []
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def size(self, desired=None):
+        """Threads a fixed lease asking for desired gets (all cores if it does not say)."""
+        return max(1, min(self.total, int(desired or self.total)))
+
+    def idle(self):
+        with self.lock:
+            return not self.leases
+
+    def acquire(self, stage, job_id=None, weight=1.0, desired=None, elastic=False):
+        with self.lock:
+            lease = Lease(next(self.ids), stage, job_id, weight, desired, elastic)
+            if not elastic:
+                # A lease that fits on its own never waits, the others wait
+                # for the fixed leases running now to leave them room
+                lease.threads = self._fixed_size(desired)
+                while self._fixed_threads() and self._fixed_threads() + lease.threads > self.total:
+                    self.freed.wait()
+                    lease.threads = self._fixed_size(desired)
+            self.leases[lease.id] = lease
+            self._rebalance()
+            snapshot = self._snapshot()
+        log.debug(f"{stage} lease granted {lease.threads} threads: {snapshot}")
+        self._notify()
+        return lease
+
+    def release(self, lease):
+        with self.lock:
+            if self.leases.pop(lease.id, None) is None:
+                return
+            self._rebalance()
+            self.freed.notify_all()
+        self._notify()
+
+    @contextlib.contextmanager
+    def lease(self, stage, job_id=None, weight=1.0, desired=None, elastic=False):
+        lease = self.acquire(stage, job_id, weight, desired, elastic)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def threads_for(self, stage):
+        with self.lock:
+            return sum(l.threads for l in self.leases.values() if l.stage == stage)
+
+    def snapshot(self):
+        with self.lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        return {"total": self.total, "leases": [l.to_dict() for l in self.leases.values()]}
+
+    def _notify(self):
+        for callback in self.listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                log.warning(f"CPU budget listener failed: {e}")
+
+    def _fixed_size(self, desired):
+        if desired:
+            return self.size(desired)
+        elastic = sum(1 for l in self.leases.values() if l.elastic)
+        # One diarization leaves transcription total - total // 2
+        return max(1, self.total - self.total * elastic // (elastic + 1))
+
+    def _fixed_threads(self):
+        return sum(l.threads for l in self.leases.values() if not l.elastic)
+
+    def _rebalance(self):
+        """Water-fill the cores the fixed leases leave between the elastic leases."""
+        remaining = self.total - self._fixed_threads()
+        pending = [l for l in self.leases.values() if l.elastic]
+
+        while pending:
+            weights = sum(l.weight for l in pending)
+            shares = {l.id: max(remaining, 0) * l.weight / weights for l in pending}
+            # Leases that want less than their fair share get exactly what
+            # they asked for and give the rest to the others
+            capped = [l for l in pending if l.desired and l.desired <= shares[l.id]]
+            if not capped:
+                for l in pending:
+                    l.threads = max(1, int(shares[l.id]))
+                break
+            for l in capped:
+                l.threads = l.desired
+                remaining -= l.desired
+                pending.remove(l)
@@ -0,0 +1,55 @@
+"""
+Named decoder settings, so a job can trade accuracy for speed without
+switching to a smaller model.
+
+"accurate" is what faster-whisper does by default: beam search with 5
+beams, 5 samples per temperature and the full temperature fallback, with
+the previous window's text as prompt. On mlx it is mlx_whisper's default,
+which draws one sample per fallback temperature. "balanced" keeps a small beam and a
+shorter fallback, "fast" is greedy decoding without fallback or prompt.
+Not conditioning on the previous text also stops one bad window from
+dragging the next ones into a repetition loop.
+
+Measure them with server-testing/benchmark.py --profiles fast,balanced,accurate.
+"""
+import os
+
+PROFILES = {
+    "fast": {
+        "beam_size": 1,
+        "best_of": 1,
+        "temperature": [0.0],
+        "condition_on_previous_text": False,
+    },
+    "balanced": {
+        "beam_size": 3,
+        "best_of": 3,
+        "temperature": [0.0, 0.2, 0.4, 0.6],
+        "condition_on_previous_text": False,
+    },
+    "accurate": {
+        "beam_size": 5,
+        "best_of": 5,
+        "temperature": [0.0, 0.2, 0.4, 0.6, 0.8, 1.0],
+        "condition_on_previous_text": True,
+    },
+}
+
+# Until the reference corpus says otherwise, jobs decode as they always did
+DEFAULT_PROFILE = os.environ.get("AUTOSUBS_DECODING_PROFILE", "accurate")
+
+# mlx_whisper has no beam search
+MLX_OPTIONS = ("best_of", "temperature", "condition_on_previous_text")
+
+
+def profile_options(name, backend="faster-whisper"):
+    """Decoder keyword arguments for a profile name."""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown decoding profile {name!r}, expected one of {', '.join(PROFILES)}")
+    options = dict(PROFILES[name])
+    if backend == "mlx":
+        options = {k: v for k, v in options.items() if k in MLX_OPTIONS}
+        if name == "accurate":
+            # best_of was never passed to mlx_whisper, default jobs keep decoding as before
+            del options["best_of"]
+    return options
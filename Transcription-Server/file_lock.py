@@ -0,0 +1,50 @@
+"""
+Cross-process updates of the JSON stores under the cache directory.
+
+Pre-forked workers (prefork.py) each keep the stores in memory. Writing the
+memory copy back would drop whatever another worker saved in between, so
+every update re-reads the file under an exclusive lock, applies its change
+and replaces the file atomically.
+"""
+import contextlib
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: there are no worker processes without fork
+    fcntl = None
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Exclusive lock on path (through path + ".lock") while the block runs."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def update_json(path, change, default=dict):
+    """
+    Apply change(data) to the JSON document at path (default() if it is
+    missing or unreadable) and write it back. Returns the new document.
+    """
+    with locked(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = default()
+        change(data)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, path)
+    return data
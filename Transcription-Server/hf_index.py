@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+from logger import get_logger
+
+log = get_logger("models")
+
+
+class HfCacheIndex(object):
+    """
+    In-memory view of the Hugging Face hub cache directory
+    (models--{org}--{name}/refs and snapshots), so checking whether a model
+    is available offline does not go through snapshot_download() each time.
+
+    The index is rebuilt when any repo directory changes or after ttl seconds.
+    """
+
+    def __init__(self, directory, ttl=300.0):
+        self.directory = directory
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.repos = {}
+        self.signature = None
+        self.built_at = 0.0
+
+    def _signature(self):
+        # Downloads add repo folders (top level) or snapshots/refs entries
+        try:
+            entries = [self.directory]
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.startswith("models--"):
+                        entries += [os.path.join(entry.path, "refs"), os.path.join(entry.path, "snapshots")]
+        except OSError:
+            return None
+        signature = []
+        for path in entries:
+            try:
+                signature.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                pass
+        return tuple(signature)
+
+    def _build(self):
+        repos = {}
+        try:
+            with os.scandir(self.directory) as it:
+                folders = [entry for entry in it if entry.name.startswith("models--") and entry.is_dir()]
+        except OSError:
+            folders = []
+        for folder in folders:
+            repo_id = folder.name[len("models--"):].replace("--", "/")
+            refs = {}
+            refs_dir = os.path.join(folder.path, "refs")
+            if os.path.isdir(refs_dir):
+                for name in os.listdir(refs_dir):
+                    try:
+                        with open(os.path.join(refs_dir, name), "r", encoding="utf-8") as f:
+                            refs[name] = f.read().strip()
+                    except OSError:
+                        pass
+            snapshots_dir = os.path.join(folder.path, "snapshots")
+            snapshots = set(os.listdir(snapshots_dir)) if os.path.isdir(snapshots_dir) else set()
+            repos[repo_id] = {"path": folder.path, "refs": refs, "snapshots": snapshots}
+        return repos
+
+    def refresh(self, force=False):
+        with self.lock:
+            signature = self._signature()
+            if not force and signature == self.signature and time.monotonic() - self.built_at < self.ttl:
+                return
+            start = time.perf_counter()
+            self.repos = self._build()
+            self.signature = signature
+            self.built_at = time.monotonic()
+        log.debug(f"Indexed {len(self.repos)} cached repos in {time.perf_counter() - start:.3f}s")
+
+    def is_cached(self, repo_id, revision=None, filename=None):
+        """
+        Same answer as snapshot_download(repo_id, revision, local_files_only=True)
+        succeeding, and if filename is given, whether that file of the snapshot
+        was downloaded too (a partial download leaves the snapshot directory).
+        """
+        self.refresh()
+        with self.lock:
+            repo = self.repos.get(repo_id)
+            if repo is None:
+                return False
+            revision = revision or "main"
+            commit = repo["refs"].get(revision, revision)
+            if commit not in repo["snapshots"]:
+                return False
+            path = repo["path"]
+        # Files inside a snapshot are not indexed, one stat is cheap enough
+        return filename is None or os.path.exists(os.path.join(path, "snapshots", commit, filename))
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+from logger import get_logger
+
+log = get_logger("jobs")
+
+# Finished jobs are kept this long for late status requests (seconds)
+JOB_TTL = 3600.0
+
+
+class Job(object):
+    """
+    A job running in the background. Changes are appended as events, which
+    the /jobs/{id}/events stream hands out in order, and the latest state is
+    written to a snapshot file so every worker process can report it.
+    """
+
+    def __init__(self, registry, kind, **info):
+        self.registry = registry
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.info = info
+        self.status = "queued"
+        self.error = None
+        self.created = time.time()
+        self.updated = self.created
+        self.events = []
+        self._changed = asyncio.Event()
+        # asyncio task running the job, referenced so it is not collected
+        self.task = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def snapshot(self):
+        return dict(self.info, id=self.id, kind=self.kind, status=self.status, error=self.error,
+                    revision=len(self.events),
+                    created=time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.created)),
+                    updated=time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.updated)))
+
+    def update(self, **info):
+        self.info.update(info)
+
+    def publish(self, event, data=None, status=None):
+        """Record an event (from the event loop) and wake up the listeners."""
+        if status is not None:
+            self.status = status
+        self.updated = time.time()
+        self.events.append({"id": len(self.events), "event": event, "data": data})
+        self.registry.save(self)
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def fail(self, error):
+        self.error = str(error)
+        self.publish("error", {"error": self.error}, status="failed")
+
+    async def events_after(self, index):
+        """Events from index on, waiting for the next one if there are none yet."""
+        while len(self.events) <= index and not self.finished:
+            await self._changed.wait()
+        return self.events[index:]
+
+
+class JobRegistry(object):
+    """Jobs of this process, with their snapshots under directory."""
+
+    def __init__(self, directory, ttl=JOB_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.jobs = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def create(self, kind, **info):
+        self.expire()
+        job = Job(self, kind, **info)
+        with self.lock:
+            self.jobs[job.id] = job
+        self.save(job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def status(self, job_id):
+        """Snapshot of a job, also of jobs started by another worker process."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        # ids are hex, anything else is no file of ours
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, job):
+        tmp_path = self._path(job.id) + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job.snapshot(), f, indent=4)
+            os.replace(tmp_path, self._path(job.id))
+        except OSError as e:
+            log.warning(f"Could not save job {job.id}: {e}")
+
+    def expire(self):
+        now = time.time()
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job.finished and now - job.updated > self.ttl]
+            for job_id in expired:
+                del self.jobs[job_id]
+        for job_id in expired:
+            try:
+                os.remove(self._path(job_id))
+            except OSError:
+                pass
+
+    def snapshots(self):
+        with self.lock:
+            return [job.snapshot() for job in self.jobs.values()]
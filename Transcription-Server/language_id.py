@@ -0,0 +1,100 @@
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+
+from file_lock import update_json
+from logger import get_logger
+
+log = get_logger("language")
+
+SAMPLE_RATE = 16000
+
+
+def audio_hash(audio):
+    """Content hash of decoded samples, the same for every copy of a recording."""
+    return hashlib.blake2b(np.ascontiguousarray(audio).data, digest_size=16).hexdigest()
+
+
+def speech_windows(audio, count=3, seconds=30):
+    """
+    Up to `count` windows of speech spread over the file (start, middle,
+    end). VAD only runs on a probe region around each point, so the cost
+    does not grow with the length of the file.
+    """
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    window = seconds * SAMPLE_RATE
+    probe = 2 * window
+    total = len(audio)
+    if total <= probe:
+        starts = [0]
+    else:
+        starts = sorted({max(0, min(total - probe, int(total * (i + 1) / (count + 1)) - window))
+                         for i in range(count)})
+
+    options = VadOptions(min_silence_duration_ms=500)
+    windows = []
+    for start in starts:
+        region = np.asarray(audio[start:start + probe], dtype=np.float32)
+        spans = get_speech_timestamps(region, options)
+        if not spans:
+            continue
+        speech = np.concatenate([region[s["start"]:s["end"]] for s in spans])[:window]
+        # Less than a second of speech says little about the language
+        if len(speech) >= SAMPLE_RATE:
+            windows.append(speech)
+    return windows
+
+
+def detect_language(model, windows):
+    """Most likely language over all windows and its mean probability."""
+    totals = {}
+    for window in windows:
+        _, _, probabilities = model.detect_language(audio=window)
+        for language, probability in probabilities:
+            totals[language] = totals.get(language, 0.0) + probability
+    language = max(totals, key=totals.get)
+    return language, totals[language] / len(windows)
+
+
+class LanguageCache(object):
+    """Detected language per audio hash, stored as JSON under the cache directory."""
+
+    def __init__(self, path, max_entries=2000):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, language, probability, model):
+        entry = {
+            "language": language,
+            "probability": round(probability, 4),
+            "model": model,
+            "detected_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+        def change(entries):
+            # Merged with the detections of the other worker processes
+            entries[key] = entry
+            # Oldest first, drop beyond the limit
+            for old in sorted(entries, key=lambda k: entries[k]["detected_at"])[:-self.max_entries]:
+                del entries[old]
+
+        with self.lock:
+            self.entries[key] = entry
+            try:
+                self.entries = update_json(self.path, change)
+            except OSError as e:
+                log.warning(f"Could not save language cache: {e}")
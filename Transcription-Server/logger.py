@@ -0,0 +1,228 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+# Job id of the request being processed, attached to every log record
+job_id_var = contextvars.ContextVar("job_id", default=None)
+
+# Records and raw stream writes share one queue so their order is preserved
+_queue = queue.SimpleQueue()
+_writer = None
+_streams = {}
+
+
+class QueueStream(object):
+    """
+    File-like replacement for stdout/stderr. Writes are handed to the writer
+    thread instead of hitting the terminal (or the Tauri pipe) directly, so
+    prints from libraries never block the inference thread on a flush.
+    """
+
+    def __init__(self, name, stream):
+        self.name = name
+        self.stream = stream
+
+    def write(self, data):
+        if data:
+            _queue.put(("raw", self.name, data))
+        return len(data)
+
+    def writelines(self, datas):
+        for data in datas:
+            self.write(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def __getattr__(self, attr):
+        return getattr(self.stream, attr)
+
+
+class _Handler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Formatting happens on the writer thread
+        return record
+
+    def enqueue(self, record):
+        _queue.put(("record", None, record))
+
+
+class _JobFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, "job_id"):
+            record.job_id = job_id_var.get()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        message = record.getMessage()
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        job = f" [job {record.job_id}]" if record.job_id else ""
+        return f"{record.levelname}{job}: {message}"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "job": record.job_id,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _Writer(threading.Thread):
+    def __init__(self, formatter, record_stream):
+        super().__init__(name="log-writer", daemon=True)
+        self.formatter = formatter
+        self.record_stream = record_stream
+
+    def run(self):
+        while True:
+            item = _queue.get()
+            dirty = set()
+            # Drain everything that is already queued before flushing once
+            while item is not None:
+                kind, name, payload = item
+                if kind == "stop":
+                    self._flush(dirty)
+                    return
+                if kind == "record":
+                    name = self.record_stream
+                    payload = self.formatter.format(payload) + "\n"
+                stream = _streams.get(name)
+                if stream is not None:
+                    try:
+                        stream.write(payload)
+                    except Exception:
+                        pass
+                    dirty.add(name)
+                try:
+                    item = _queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            self._flush(dirty)
+
+    @staticmethod
+    def _flush(names):
+        for name in names:
+            try:
+                _streams[name].flush()
+            except Exception:
+                pass
+
+
+def setup_logging(level=None, fmt=None):
+    """
+    Route logging and stdout/stderr through the background writer thread.
+    Level and format default to AUTOSUBS_LOG_LEVEL (INFO) and
+    AUTOSUBS_LOG_FORMAT ("text" or "json").
+    """
+    global _writer
+    if _writer is not None:
+        return
+
+    level = (level or os.environ.get("AUTOSUBS_LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.environ.get("AUTOSUBS_LOG_FORMAT", "text")).lower()
+
+    _streams["stdout"] = sys.stdout
+    _streams["stderr"] = sys.stderr
+    sys.stdout = QueueStream("stdout", sys.stdout)
+    sys.stderr = QueueStream("stderr", sys.stderr)
+
+    formatter = JsonFormatter() if fmt == "json" else TextFormatter()
+    _writer = _Writer(formatter, "stdout")
+    _writer.start()
+
+    handler = _Handler(None)
+    handler.addFilter(_JobFilter())
+    root = logging.getLogger("autosubs")
+    root.addHandler(handler)
+    root.setLevel(level)
+    root.propagate = False
+
+    atexit.register(shutdown_logging)
+
+
+def _after_fork_in_child():
+    # The writer thread does not exist in a forked child, give it a fresh
+    # queue (the old one may be locked) and its own writer
+    global _queue, _writer
+    if _writer is None:
+        return
+    _queue = queue.SimpleQueue()
+    _writer = _Writer(_writer.formatter, _writer.record_stream)
+    _writer.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def shutdown_logging():
+    global _writer
+    if _writer is None:
+        return
+    _queue.put(("stop", None, None))
+    _writer.join(timeout=2)
+    _writer = None
+    sys.stdout = _streams.get("stdout", sys.stdout)
+    sys.stderr = _streams.get("stderr", sys.stderr)
+
+
+def get_logger(name=None):
+    return logging.getLogger("autosubs" if name is None else f"autosubs.{name}")
+
+
+def verbose_enabled(requested=False):
+    """Per-segment transcription output is opt-in (request flag or AUTOSUBS_VERBOSE=1)."""
+    return bool(requested) or os.environ.get("AUTOSUBS_VERBOSE", "0") not in ("", "0", "false")
+
+
+class ProgressReporter(object):
+    """
+    Progress callback that logs "Progress: N%" at most once per interval and
+    only when the whole-number percentage changes. Completion is always logged.
+
+    When a file is decoded in parts, set total to its duration and offset to
+    where the current part starts, so the percentage covers the whole file.
+    """
+
+    def __init__(self, log, min_interval=1.0, total=None):
+        self.log = log
+        self.min_interval = min_interval
+        self.total = total
+        self.offset = 0.0
+        self.last_time = 0.0
+        self.last_percent = None
+
+    def __call__(self, seek, total_duration):
+        if self.total is not None:
+            seek, total_duration = self.offset + seek, self.total
+        if not total_duration:
+            return
+        percent = min(100, int(seek / total_duration * 100))
+        now = time.monotonic()
+        if percent == self.last_percent:
+            return
+        if percent < 100 and now - self.last_time < self.min_interval:
+            return
+        self.last_time = now
+        self.last_percent = percent
+        self.log.info(f"Progress: {percent}%")
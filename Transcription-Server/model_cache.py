@@ -0,0 +1,309 @@
+import contextlib
+import ctypes
+import gc
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from logger import get_logger
+
+log = get_logger("models")
+
+DIARIZATION_PIPELINE = "pyannote/speaker-diarization-3.1"
+
+# Unload models nobody used for this long (seconds, 0 = keep them forever)
+IDLE_TIMEOUT = float(os.environ.get("AUTOSUBS_MODEL_IDLE_TIMEOUT", "900"))
+# Unload idle models early when less system memory than this is available
+MIN_AVAILABLE_MB = float(os.environ.get("AUTOSUBS_MIN_AVAILABLE_MB", "1024"))
+CHECK_INTERVAL = 30.0
+
+
+class _Entry(object):
+    def __init__(self, value):
+        self.value = value
+        self.loaded_at = time.time()
+        self.last_used = time.monotonic()
+        self.users = 0
+
+
+# Resident models keyed by everything that affects how they were loaded
+_models = {}
+_lock = threading.Lock()
+_key_locks = {}
+_reaper_pid = None
+
+# pyannote pipelines are not safe to call from several threads at once
+diarization_lock = threading.Lock()
+
+stats = {"loads": 0, "hits": 0, "unloads": 0, "freed_mb": 0.0}
+recent_unloads = []
+
+# Called with (key, seconds, added_mb) after every load
+_load_listeners = []
+
+
+def add_load_listener(listener):
+    _load_listeners.append(listener)
+
+
+def _hit(key, pin):
+    entry = _models[key]
+    stats["hits"] += 1
+    entry.last_used = time.monotonic()
+    if pin:
+        entry.users += 1
+    return entry.value
+
+
+def _get_or_load(key, loader, pin=False):
+    """
+    The model under key, loaded once. With pin it is marked in use in the
+    same locked section that hands it out, so the reaper cannot unload it
+    before the caller's in_use(value, pinned=True) block.
+    """
+    _start_reaper()
+    with _lock:
+        if key in _models:
+            return _hit(key, pin)
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    # Only one thread loads a given model, the others wait for it
+    with key_lock:
+        with _lock:
+            if key in _models:
+                return _hit(key, pin)
+        log.info(f"Loading {key[0]} model: {key[1]}")
+        before = rss_mb()
+        start = time.perf_counter()
+        value = loader()
+        seconds = time.perf_counter() - start
+        after = rss_mb()
+        with _lock:
+            _models[key] = _Entry(value)
+            if pin:
+                _models[key].users += 1
+            stats["loads"] += 1
+    added = after - before if before is not None and after is not None else None
+    for listener in _load_listeners:
+        try:
+            listener(key, seconds, added)
+        except Exception as e:
+            log.warning(f"Load listener failed: {e}")
+    return value
+
+
+@contextlib.contextmanager
+def in_use(value, pinned=False):
+    """
+    Mark a model as busy while a job runs it, so it is never unloaded mid-job.
+    pinned: the getter already marked it (pin=True), the block only releases it.
+    """
+    with _lock:
+        entry = next((e for e in _models.values() if e.value is value), None)
+        if entry is not None and not pinned:
+            entry.users += 1
+    try:
+        yield value
+    finally:
+        if entry is not None:
+            with _lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+
+
+def get_whisper_model(model_name, device, compute_type, cpu_threads=0, num_workers=1, model_path=None, pin=False):
+    """Load (once) a faster-whisper model wrapped by stable-ts, from model_path if given."""
+    import stable_whisper
+    key = ("faster-whisper", model_name, device, compute_type, cpu_threads, num_workers)
+    return _get_or_load(key, lambda: stable_whisper.load_faster_whisper(
+        model_path or model_name,
+        device=device,
+        compute_type=compute_type,
+        cpu_threads=cpu_threads,
+        num_workers=num_workers,
+    ), pin)
+
+
+def get_diarization_pipeline(device, pin=False):
+    """Load (once) the pyannote diarization pipeline on the given device."""
+    def load():
+        from pyannote.audio import Pipeline
+        pipeline = Pipeline.from_pretrained(DIARIZATION_PIPELINE)
+        pipeline.to(device)
+        return pipeline
+
+    return _get_or_load(("pyannote", DIARIZATION_PIPELINE, str(device)), load, pin)
+
+
+def resident_models():
+    now = time.monotonic()
+    with _lock:
+        return [{
+            "backend": key[0],
+            "model": key[1],
+            "device": str(key[2]),
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(entry.loaded_at)),
+            "idle_seconds": round(now - entry.last_used, 1),
+            "in_use": entry.users > 0,
+        } for key, entry in _models.items()]
+
+
+# ---------------------------------------------------------------------------
+# Unloading
+# ---------------------------------------------------------------------------
+
+def rss_mb():
+    """Resident memory of this process in MB, None if it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _MemoryStatusEx(ctypes.Structure):
+    _fields_ = [
+        ("dwLength", ctypes.c_ulong),
+        ("dwMemoryLoad", ctypes.c_ulong),
+        ("ullTotalPhys", ctypes.c_ulonglong),
+        ("ullAvailPhys", ctypes.c_ulonglong),
+        ("ullTotalPageFile", ctypes.c_ulonglong),
+        ("ullAvailPageFile", ctypes.c_ulonglong),
+        ("ullTotalVirtual", ctypes.c_ulonglong),
+        ("ullAvailVirtual", ctypes.c_ulonglong),
+        ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+    ]
+
+
+def _os_available_mb():
+    """available_mb() without psutil, from what each OS reports."""
+    if sys.platform.startswith("linux"):
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+        return None
+    if sys.platform == "win32":
+        status = _MemoryStatusEx()
+        status.dwLength = ctypes.sizeof(status)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return None
+        return status.ullAvailPhys / 2**20
+    if sys.platform == "darwin":
+        # Free, inactive and purgeable pages can be handed out without swapping
+        output = subprocess.run(["vm_stat"], capture_output=True, text=True, timeout=5).stdout
+        page_size = int(re.search(r"page size of (\d+) bytes", output).group(1))
+        pages = {name: int(count) for name, count in re.findall(r"^Pages ([\w ]+):\s+(\d+)\.", output, re.M)}
+        return sum(pages.get(name, 0) for name in ("free", "inactive", "purgeable")) * page_size / 2**20
+    return None
+
+
+def available_mb():
+    """System memory available in MB, None if unknown."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available / 2**20
+    except ImportError:
+        pass
+    try:
+        return _os_available_mb()
+    except (OSError, ValueError, AttributeError, subprocess.SubprocessError):
+        return None
+
+
+def reclaim_memory():
+    """Return freed memory to the OS after models were dropped."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if sys.platform.startswith("linux"):
+        # glibc keeps freed heap pages for reuse, hand them back
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+def unload(keys=None, reason="requested"):
+    """
+    Unload the given models (all idle ones by default). Models in use by a
+    job are skipped. Returns the unloaded models and the memory freed.
+    """
+    before = rss_mb()
+    unloaded = []
+    with _lock:
+        for key in list(_models if keys is None else keys):
+            entry = _models.get(key)
+            if entry is None or entry.users > 0:
+                continue
+            del _models[key]
+            unloaded.append({"backend": key[0], "model": key[1], "device": str(key[2])})
+        # the loop variable would keep the last model alive through the collection
+        entry = None
+    if not unloaded:
+        return {"unloaded": [], "freed_mb": 0.0}
+
+    reclaim_memory()
+    after = rss_mb()
+    freed = round(max(0.0, before - after), 1) if before is not None and after is not None else None
+    with _lock:
+        stats["unloads"] += len(unloaded)
+        stats["freed_mb"] = round(stats["freed_mb"] + (freed or 0.0), 1)
+        recent_unloads.append({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "reason": reason,
+                               "models": unloaded, "freed_mb": freed})
+        del recent_unloads[:-20]
+    log.info(f"Unloaded {', '.join(m['model'] for m in unloaded)} ({reason}), freed {freed} MB")
+    return {"unloaded": unloaded, "freed_mb": freed}
+
+
+def _idle_keys(min_idle):
+    now = time.monotonic()
+    with _lock:
+        idle = [(entry.last_used, key) for key, entry in _models.items()
+                if entry.users == 0 and now - entry.last_used >= min_idle]
+    # least recently used first
+    return [key for _, key in sorted(idle)]
+
+
+def _reap():
+    warned = False
+    while True:
+        time.sleep(CHECK_INTERVAL)
+        try:
+            if IDLE_TIMEOUT > 0:
+                expired = _idle_keys(IDLE_TIMEOUT)
+                if expired:
+                    unload(expired, reason="idle")
+            # Under memory pressure give up idle models one at a time, least
+            # recently used first, until enough memory is available again
+            for key in _idle_keys(0):
+                available = available_mb()
+                if available is None and not warned:
+                    warned = True
+                    log.warning("Available memory cannot be read, models are not unloaded under memory pressure")
+                if available is None or available >= MIN_AVAILABLE_MB:
+                    break
+                unload([key], reason=f"memory pressure ({available:.0f} MB available)")
+        except Exception as e:
+            log.warning(f"Model reaper failed: {e}")
+
+
+def _start_reaper():
+    # Threads do not survive fork, so every (pre-forked) process starts its own
+    global _reaper_pid
+    if _reaper_pid == os.getpid():
+        return
+    with _lock:
+        if _reaper_pid == os.getpid():
+            return
+        _reaper_pid = os.getpid()
+    threading.Thread(target=_reap, name="model-reaper", daemon=True).start()
@@ -0,0 +1,142 @@
+"""
+Local store of faster-whisper models, loaded from a plain directory.
+
+Loading by name makes faster-whisper resolve the repo on the hub
+(snapshot_download) before it reads anything, which is a network round
+trip per load and a slow timeout offline. The store keeps one verified
+copy of each model (hard links into hf_cache where possible, so no disk
+space is used twice) with a manifest of the files, and loads use that
+directory directly.
+
+ctranslate2 cannot map its weights: it reads model.bin into its own
+buffers and converts them to the compute type while loading. What the
+store can do is keep the file resident in the page cache (warm()) so the
+read part of a load never touches the disk.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from logger import get_logger
+
+log = get_logger("models")
+
+MANIFEST = "manifest.json"
+
+
+def _link_or_copy(source, target):
+    try:
+        # Same volume as hf_cache: share the blob instead of copying it
+        os.link(os.path.realpath(source), target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class ModelStore(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.model_locks = {}
+        # Models whose manifest was checked in this process
+        self.verified = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _model_dir(self, model_name):
+        return os.path.join(self.directory, model_name.replace("/", "--"))
+
+    def _read_manifest(self, model_dir):
+        try:
+            with open(os.path.join(model_dir, MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def verify(self, model_name):
+        """
+        Check a stored model against its manifest (size and modification
+        time of every file). Returns the manifest or None.
+        """
+        model_dir = self._model_dir(model_name)
+        manifest = self._read_manifest(model_dir)
+        if manifest is None:
+            return None
+        for name, expected in manifest["files"].items():
+            try:
+                stat = os.stat(os.path.join(model_dir, name))
+            except OSError:
+                return None
+            # Manifests written before mtime was recorded are stored again
+            if stat.st_size != expected["size"] or stat.st_mtime_ns != expected.get("mtime_ns"):
+                return None
+        return manifest
+
+    def add(self, model_name):
+        """Copy a model from the hub cache (downloading it if needed) into the store."""
+        from faster_whisper.utils import download_model
+
+        start = time.time()
+        source = download_model(model_name)
+        model_dir = self._model_dir(model_name)
+        tmp_dir = f"{model_dir}.{uuid.uuid4().hex[:8]}.tmp"
+        os.makedirs(tmp_dir)
+        files = {}
+        try:
+            for name in sorted(os.listdir(source)):
+                path = os.path.join(source, name)
+                if not os.path.isfile(path):
+                    continue
+                target = os.path.join(tmp_dir, name)
+                _link_or_copy(path, target)
+                stat = os.stat(target)
+                files[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            manifest = {
+                "model": model_name,
+                "source": source,
+                "revision": os.path.basename(os.path.normpath(source)),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "files": files,
+            }
+            with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=4)
+            if os.path.exists(model_dir):
+                shutil.rmtree(model_dir)
+            os.replace(tmp_dir, model_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        log.info(f"Added {model_name} to the model store in {time.time() - start:.1f}s")
+        return manifest
+
+    def path(self, model_name):
+        """Directory to load model_name from, added to the store on first use."""
+        with self.lock:
+            model_lock = self.model_locks.setdefault(model_name, threading.Lock())
+        with model_lock:
+            if model_name not in self.verified:
+                manifest = self.verify(model_name)
+                if manifest is None:
+                    manifest = self.add(model_name)
+                self.verified[model_name] = manifest
+        return self._model_dir(model_name)
+
+    def warm(self, model_name):
+        """Read the weights once so the next load is served from the page cache."""
+        model_path = self.path(model_name)
+        with open(os.path.join(model_path, "model.bin"), "rb") as f:
+            while f.read(16 * 1024 * 1024):
+                pass
+        return model_path
+
+    def entries(self):
+        result = []
+        for name in sorted(os.listdir(self.directory)):
+            manifest = self._read_manifest(os.path.join(self.directory, name))
+            if manifest is not None:
+                size = sum(f["size"] for f in manifest["files"].values())
+                result.append({"model": manifest["model"], "revision": manifest["revision"],
+                               "created": manifest["created"], "size_mb": round(size / 2**20, 1)})
+        return result
@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+
+from file_lock import update_json
+from logger import get_logger
+
+log = get_logger("models")
+
+
+class ModelUsage(object):
+    """
+    How often each model (and the diarization pipeline) was used, stored as
+    JSON under the cache directory so startup knows what to warm.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        return self._defaults(data)
+
+    @staticmethod
+    def _defaults(data):
+        data.setdefault("models", {})
+        data.setdefault("diarize", {"count": 0, "last_used": None})
+        return data
+
+    def record(self, model_id, diarize=False):
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+        def change(data):
+            # Counted on top of what the other worker processes recorded
+            self._defaults(data)
+            entry = data["models"].setdefault(model_id, {"count": 0, "last_used": None})
+            entry["count"] += 1
+            entry["last_used"] = now
+            if diarize:
+                data["diarize"]["count"] += 1
+                data["diarize"]["last_used"] = now
+
+        with self.lock:
+            try:
+                self.data = update_json(self.path, change)
+            except OSError as e:
+                log.warning(f"Could not save model usage: {e}")
+
+    def most_used(self):
+        """Most used model id (latest use breaks ties), None before the first job."""
+        with self.lock:
+            models = self.data["models"]
+            if not models:
+                return None
+            return max(models, key=lambda m: (models[m]["count"], models[m]["last_used"] or ""))
+
+    def diarize_share(self):
+        """Fraction of jobs that ran diarization."""
+        with self.lock:
+            jobs = sum(m["count"] for m in self.data["models"].values())
+            return self.data["diarize"]["count"] / jobs if jobs else 0.0
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.data))
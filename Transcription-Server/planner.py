@@ -0,0 +1,300 @@
+"""
+Predicts how long a transcription takes on this host and how much memory
+it needs, to pick a model that meets a deadline and to answer /estimate/.
+
+Every job that ran alone, with the default thread count, records the
+real-time factor (stage seconds per second of audio) of its stages; the
+transcription's per decoding profile and batch size, which change it the
+most. Until a model has been measured that way, the calibration run (greedy
+decode of a 30 s clip) or a rough default, both scaled to the profile,
+stands in for it.
+
+Memory is the resident memory of the process now, plus the models the job
+would load (measured at every load) plus the job's working memory: the
+decoded audio and a fixed overhead per model, sampled while jobs run alone.
+"""
+import json
+import threading
+import time
+
+from calibration import host_key
+from decoding import DEFAULT_PROFILE
+from file_lock import update_json
+from logger import get_logger
+from model_cache import rss_mb
+
+log = get_logger("planner")
+
+# Rough CPU real-time factors (int8, all cores, default decoding) per model
+# size and per stage, used before anything was measured on this host
+PRIOR_RTF = {
+    "tiny": 0.05,
+    "base": 0.08,
+    "small": 0.25,
+    "medium": 0.7,
+    "large": 0.5,
+}
+PRIOR_STAGE_RTF = {
+    "diarize": 0.15,
+    "align": 0.1,
+}
+# Decoding time of each profile against "accurate" (beam 5 with fallback),
+# which is what the priors are. Calibration decodes greedily, as "fast" does
+PROFILE_FACTOR = {"fast": 0.5, "balanced": 0.75, "accurate": 1.0}
+# GPUs (and Apple silicon through mlx) decode this much faster than the priors
+ACCELERATOR_SPEEDUP = {"cuda": 8.0, "mlx": 4.0}
+# Model load when it is not resident yet (seconds)
+PRIOR_LOAD_SECONDS = 5.0
+# Resident memory a model adds once loaded (MB, int8 on the CPU)
+PRIOR_MODEL_MB = {
+    "tiny": 150,
+    "base": 250,
+    "small": 600,
+    "medium": 1500,
+    "large": 1700,
+}
+PRIOR_DIARIZATION_MB = 500
+# Working memory of a job on top of the loaded models (MB)
+PRIOR_WORKING_MB = 300
+PRIOR_DIARIZE_WORKING_MB = 400
+# Decoded 16 kHz float32 samples take 0.06 MB a second, the cached copy,
+# the slices and the waveform handed to pyannote about three times that
+AUDIO_MB_PER_SECOND = 0.2
+# How often the resident memory is read while a job runs (seconds)
+SAMPLE_INTERVAL = 0.25
+# Weight of the newest job in the running averages
+ALPHA = 0.3
+
+
+class JobStats(object):
+    """Running averages of the stage real-time factors of finished jobs, per host."""
+
+    def __init__(self, path):
+        self.path = path
+        self.host = host_key()
+        self.lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get(self.host, {})
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, key, value, **extra):
+        """Fold a measurement into the running average stored under key."""
+        def change(data):
+            # Averaged with what the other worker processes recorded since
+            entries = data.setdefault(self.host, {})
+            entry = entries.get(key)
+            if entry is None:
+                entry = entries[key] = {"value": value, "jobs": 0}
+            else:
+                entry["value"] = (1 - ALPHA) * entry["value"] + ALPHA * value
+            entry["value"] = round(entry["value"], 5)
+            entry["jobs"] += 1
+            entry["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            entry.update(extra)
+
+        with self.lock:
+            try:
+                self.entries = update_json(self.path, change)[self.host]
+            except OSError as e:
+                log.warning(f"Could not save job stats: {e}")
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry["value"] if entry is not None else None
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.entries))
+
+
+def stat_key(stage, model, device, variant=None):
+    key = f"{stage}|{model}|{device}"
+    return f"{key}|{variant}" if variant else key
+
+
+def transcribe_variant(profile=DEFAULT_PROFILE, batch_size=0):
+    """What transcription speeds are kept apart by: the profile and batched inference."""
+    return f"{profile}|batch{batch_size}" if batch_size > 1 else profile
+
+
+class PeakMemory(object):
+    """Highest resident memory of the process while the block runs, read by a thread."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        current = rss_mb()
+        if current is not None and (self.peak_mb is None or current > self.peak_mb):
+            self.peak_mb = current
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_mb = rss_mb()
+        self.peak_mb = self.start_mb
+        self._thread = threading.Thread(target=self._run, name="peak-memory", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+
+class Planner(object):
+    """Predicted job durations, and the work still ahead of the jobs running now."""
+
+    def __init__(self, stats, calibration=None):
+        self.stats = stats
+        self.calibration = calibration
+        self.lock = threading.Lock()
+        # job key -> (predicted seconds, started at)
+        self.running = {}
+
+    def rtf(self, stage, model, device, size=None, profile=DEFAULT_PROFILE, batch_size=0):
+        """Real-time factor of a stage and where it comes from."""
+        variant = transcribe_variant(profile, batch_size) if stage == "transcribe" else None
+        measured = self.stats.get(stat_key(stage, model, device, variant))
+        if measured is not None:
+            return measured, "measured"
+        factor = PROFILE_FACTOR.get(profile, 1.0) if stage == "transcribe" else 1.0
+        if stage == "transcribe" and device == "cpu" and self.calibration is not None:
+            entry = self.calibration.get(model)
+            if entry is not None:
+                single = [t for t in entry["trials"] if t["num_workers"] == 1
+                          and t["compute_type"] == entry["compute_type"] and t["cpu_threads"] == entry["cpu_threads"]]
+                if single:
+                    # the clip is 30 s long
+                    return single[0]["seconds"] / 30 / PROFILE_FACTOR["fast"] * factor, "calibration"
+        if stage == "transcribe":
+            prior = PRIOR_RTF.get((size or model).split(".")[0], PRIOR_RTF["small"])
+        else:
+            prior = PRIOR_STAGE_RTF[stage]
+        return prior * factor / ACCELERATOR_SPEEDUP.get(device, 1.0), "prior"
+
+    def record(self, model, device, duration, timings, profile=DEFAULT_PROFILE, batch_size=0):
+        """
+        Learn from a finished job: timings are the stage seconds of its result.
+        Only jobs that had the machine to themselves are representative.
+        """
+        if not duration:
+            return
+        for stage, seconds in timings.items():
+            if stage == "transcribe":
+                self.stats.record(stat_key(stage, model, device, transcribe_variant(profile, batch_size)),
+                                  seconds / duration)
+            elif stage == "align":
+                self.stats.record(stat_key(stage, model, device), seconds / duration)
+            elif stage == "diarize":
+                self.stats.record(stat_key(stage, "pyannote", device), seconds / duration)
+
+    def record_load(self, model, device, seconds, added_mb=None):
+        """Learn from a model load: its duration and the memory it added."""
+        self.stats.record(stat_key("load_seconds", model, device), seconds)
+        # a load running next to another job also counts that job's allocations
+        if added_mb is not None and added_mb > 0 and len(self.running) <= 1:
+            self.stats.record(stat_key("model_mb", model, device), added_mb)
+
+    def record_memory(self, model, device, duration, diarize, sample):
+        """Learn the working memory of a job from its PeakMemory sample."""
+        if sample.start_mb is None or sample.peak_mb is None:
+            return
+        working = sample.peak_mb - sample.start_mb - AUDIO_MB_PER_SECOND * duration
+        self.stats.record(stat_key("working_diarize_mb" if diarize else "working_mb", model, device),
+                          max(0.0, working))
+
+    def load_seconds(self, model, device):
+        measured = self.stats.get(stat_key("load_seconds", model, device))
+        return (measured, "measured") if measured is not None else (PRIOR_LOAD_SECONDS, "prior")
+
+    def model_mb(self, model, device, size=None):
+        measured = self.stats.get(stat_key("model_mb", model, device))
+        if measured is not None:
+            return measured, "measured"
+        if model == "pyannote":
+            return PRIOR_DIARIZATION_MB, "prior"
+        return PRIOR_MODEL_MB.get((size or model).split(".")[0], PRIOR_MODEL_MB["small"]), "prior"
+
+    def working_mb(self, model, device, diarize=False):
+        measured = self.stats.get(stat_key("working_diarize_mb" if diarize else "working_mb", model, device))
+        if measured is not None:
+            return measured, "measured"
+        return PRIOR_WORKING_MB + (PRIOR_DIARIZE_WORKING_MB if diarize else 0), "prior"
+
+    def memory(self, model, device, duration, diarize=False, resident=(), current_mb=None, size=None):
+        """
+        Peak resident memory (MB) of the process if the job ran now, by part,
+        with where each part comes from.
+        """
+        parts = {"current": current_mb or 0.0}
+        sources = {}
+        if model not in resident:
+            parts["model"], sources["model"] = self.model_mb(model, device, size)
+        if diarize and "pyannote" not in resident:
+            parts["diarization"], sources["diarization"] = self.model_mb("pyannote", device)
+        parts["working"], sources["working"] = self.working_mb(model, device, diarize)
+        parts["audio"] = AUDIO_MB_PER_SECOND * duration
+        peak = sum(parts.values())
+        return dict({k: round(v) for k, v in parts.items()}, peak=round(peak), sources=sources)
+
+    def predict(self, model, device, duration, diarize=False, align_words=False, resident=True, size=None,
+                profile=DEFAULT_PROFILE, batch_size=0):
+        """Seconds a job would take on its own, by stage."""
+        stages = {"transcribe": self.rtf("transcribe", model, device, size, profile, batch_size)[0] * duration}
+        if align_words:
+            stages["align"] = self.rtf("align", model, device)[0] * duration
+        if not resident:
+            stages["load"] = self.load_seconds(model, device)[0]
+        total = sum(stages.values())
+        if diarize:
+            stages["diarize"] = self.rtf("diarize", "pyannote", device)[0] * duration
+            # runs next to the transcription
+            total = max(total, stages["diarize"])
+        stages["total"] = total
+        return stages
+
+    def start(self, key, seconds):
+        with self.lock:
+            self.running[key] = (seconds, time.monotonic())
+
+    def finish(self, key):
+        with self.lock:
+            self.running.pop(key, None)
+
+    def backlog(self):
+        """Predicted seconds of work left in the running jobs, which share the machine."""
+        now = time.monotonic()
+        with self.lock:
+            return sum(max(0.0, seconds - (now - started)) for seconds, started in self.running.values())
+
+    def choose(self, candidates, device, duration, deadline, diarize=False, align_words=False, resident=(),
+               profile=DEFAULT_PROFILE, batch_size=0):
+        """
+        Most accurate of candidates ((size, model id) pairs, most accurate
+        first) predicted to finish within deadline seconds, the fastest one
+        if none does. Returns the decision with its prediction.
+        """
+        wait = self.backlog()
+        options = []
+        for size, model in candidates:
+            stages = self.predict(model, device, duration, diarize, align_words, model in resident, size,
+                                  profile, batch_size)
+            options.append({"size": size, "model": model, "predicted_seconds": round(wait + stages["total"], 1)})
+        chosen = next((o for o in options if o["predicted_seconds"] <= deadline), options[-1])
+        return dict(chosen, deadline_met=chosen["predicted_seconds"] <= deadline,
+                    queue_seconds=round(wait, 1), candidates=options)
@@ -0,0 +1,222 @@
+import json
+import random
+
+
+def sanitize_result(result):
+    # Convert the result to a JSON string
+    result_json = json.dumps(result, default=lambda o: None)
+    # Parse the JSON string back to a dictionary
+    sanitized_result = json.loads(result_json)
+    return sanitized_result
+
+
+def merge_diarisation(transcript, diarization):
+    # Array of colors to choose from
+    colors = ['#0062ec', '#ed63d4', '#8b5eed', '#1a8bed', '#308800',
+              '#886d4e', '#cb0000', '#6cb18c', '#d57312', '#000000']
+
+    # Dictionary to store speaker information
+    speakers_info = {}
+    speaker_counter = 1
+
+    # Match speakers to transcript segments
+    new_segments = []
+    transcript_segments = transcript["segments"]
+    diarization_turns = list(diarization.itertracks(yield_label=True))
+    diarization_segments = []
+
+    i, j = 0, 0
+    while i < len(transcript_segments) and j < len(diarization_turns):
+        segment = transcript_segments[i]
+        turn, _, speaker = diarization_turns[j]
+
+        segment_start = segment["start"]
+        segment_end = segment["end"]
+        diar_start = turn.start
+        diar_end = turn.end
+
+        if diar_end <= segment_start:
+            j += 1
+        elif segment_end <= diar_start:
+            i += 1
+        elif segment_end - diar_end >= diar_end - segment_start and j < len(diarization_turns):
+            j += 1
+        else:
+            # Overlapping segment
+            speaker_label = f"Speaker {
+                speaker_counter}" if speaker not in speakers_info else speakers_info[speaker]["label"]
+            new_segment = {
+                "start": segment_start,
+                "end": segment_end,
+                "speaker": speaker_label,
+                "text": segment["text"],
+                "words": segment["words"]
+            }
+            new_segments.append(new_segment)
+
+            diarization_segments.append({
+                "speaker": speaker_label,
+                "start": diar_start,
+                "end": diar_end
+            })
+
+            # Add speaker info if not already present
+            if speaker not in speakers_info:
+                # Select a random color and remove it from the list to avoid duplicates
+                if colors:
+                    color = random.choice(colors)
+                    colors.remove(color)
+                else:
+                    # Generate a random color if we've run out
+                    color = "#{:06x}".format(random.randint(0, 0xFFFFFF))
+                # Store speaker information
+                speakers_info[speaker] = {
+                    "label": speaker_label,
+                    "id": speaker_label,
+                    "color": color,
+                    "style": "Outline",
+                    "sample": {
+                        "start": segment_start,
+                        "end": segment_end
+                    },
+                    "subtitle_lines": 0,
+                    "word_count": 0
+                }
+                speaker_counter += 1
+            # Update speaker's subtitle lines and word count
+            speakers_info[speaker]["subtitle_lines"] += 1
+            speakers_info[speaker]["word_count"] += len(segment["words"])
+            i += 1  # Move to the next transcript segment
+
+    # Assign 'Unknown' speaker to any remaining transcript segments
+    for segment in transcript_segments[i:]:
+        new_segment = {
+            "start": segment["start"],
+            "end": segment["end"],
+            "speaker": "Unknown",
+            "text": segment["text"],
+            "words": segment["words"]
+        }
+        new_segments.append(new_segment)
+
+        # Add 'Unknown' speaker info if not already present
+        if "Unknown" not in speakers_info:
+            if colors:
+                color = random.choice(colors)
+                colors.remove(color)
+            else:
+                color = "#{:06x}".format(random.randint(0, 0xFFFFFF))
+            speakers_info["Unknown"] = {
+                "label": "Unknown",
+                "id": "Unknown",
+                "color": color,
+                "style": "outline",
+                "sample": {
+                    "start": segment["start"],
+                    "end": segment["end"]
+                },
+                "subtitle_lines": 0,
+                "word_count": 0
+            }
+        # Update 'Unknown' speaker's subtitle lines and word count
+        speakers_info["Unknown"]["subtitle_lines"] += 1
+        speakers_info["Unknown"]["word_count"] += len(segment["words"])
+
+    # Convert speakers_info dict to a list
+    speakers_list = list(speakers_info.values())
+    top_speaker = max(
+        speakers_list, key=lambda speaker: speaker["subtitle_lines"])
+
+    # Add speakers list to the result
+    result = {
+        "text": transcript["text"],
+        "language": transcript["language"],
+        "speakers": speakers_list,
+        "top_speaker": {
+            "label": top_speaker["label"],
+            "id": top_speaker["id"],
+            "percentage": round((top_speaker["subtitle_lines"] / len(transcript_segments)) * 100)
+        },
+        "segments": new_segments,
+        "diarization": diarization_segments
+    }
+    return result
+
+
+def shift_segments(segments, offset):
+    """Move segment dicts (and their words) that were transcribed from a slice starting at offset seconds."""
+    for segment in segments:
+        segment["start"] = round(segment["start"] + offset, 3)
+        segment["end"] = round(segment["end"] + offset, 3)
+        for word in segment.get("words") or []:
+            word["start"] = round(word["start"] + offset, 3)
+            word["end"] = round(word["end"] + offset, 3)
+    return segments
+
+
+def modify_result(result, max_words, max_chars, sensitive_words, remove_punctuation, text_format):
+    (
+        result
+        .split_by_punctuation([('.', ' '), '。', '?', '？', ',', '，'])
+        .split_by_gap(0.4)
+        .merge_by_gap(0.1, max_words=3)
+        .split_by_length(max_words=max_words, max_chars=max_chars)
+    )
+
+    if remove_punctuation:
+        def remove_punctuation_chars(result, seg_idx, word_idx):
+            word_obj = result[seg_idx][word_idx]
+            word_obj.word = word_obj.word.rstrip(r".,\,,?")
+
+        result.custom_operation(
+            key="word",                   # Attribute to evaluate
+            operator="end",               # Match words ending with punctuation
+            value=r"any=.,\,,?",    # Target punctuation characters
+            method=remove_punctuation_chars,  # Custom method
+            word_level=True               # Operate at the word level
+        )
+
+    if text_format == "lowercase":
+        result.custom_operation(
+            key='',  # Use the entire word object
+            operator=lambda word, _: True,  # Always match
+            value=None,  # Placeholder value
+            method=lambda result, seg_idx, word_idx: setattr(
+                result[seg_idx][word_idx], "word", result[seg_idx][word_idx].word.lower()
+            ),
+            word_level=True
+        )
+    elif text_format == "uppercase":
+        result.custom_operation(
+            key='',  # Use the entire word object
+            operator=lambda word, _: True,  # Always match
+            value=None,  # Placeholder value
+            method=lambda result, seg_idx, word_idx: setattr(
+                result[seg_idx][word_idx], "word", result[seg_idx][word_idx].word.upper()
+            ),
+            word_level=True
+        )
+
+    # matching function to identify sensitive words
+    if len(sensitive_words) > 0:
+        # lowercase the list once so each word check is a set lookup
+        sensitive_set = {w.lower() for w in sensitive_words}
+
+        def is_sensitive(word, sensitive_set):
+            return word.word.lower().strip() in sensitive_set
+
+        def censor_word(result, seg_index, word_index):
+            word = result[seg_index][word_index]
+            match = word.word.strip()
+            # Replace each character with an asterisk
+            word.word = word.word.replace(match, '*' * len(word.word.strip()))
+
+        result.custom_operation(
+            key='',                      # Empty string to use the word object directly
+            operator=is_sensitive,       # Use the is_sensitive function as the operator
+            value=sensitive_set,         # Pass the lowercased sensitive words as the value
+            method=censor_word,          # Use the censor_word function to perform the replacement
+            word_level=True              # Operate at the word level
+        )
+
+    return result
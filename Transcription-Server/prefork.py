@@ -0,0 +1,114 @@
+"""
+Pre-fork worker processes for the server (POSIX only).
+
+The parent imports everything and preloads models once, binds the listening
+socket and then forks the workers. Whatever the parent loaded before the
+fork (Python modules, torch weights) is shared copy-on-write by all workers,
+and each worker runs its own uvicorn loop and GIL on the shared socket.
+"""
+import os
+import signal
+import sys
+import threading
+import time
+
+import uvicorn
+
+from logger import get_logger
+
+log = get_logger("workers")
+
+# A worker that dies sooner than this after starting is not restarted right away
+MIN_UPTIME = 5.0
+
+
+def supported():
+    return hasattr(os, "fork") and sys.platform != "win32"
+
+
+def _watch_parent(parent_pid):
+    # Exit with the parent even if it is killed without a chance to clean up,
+    # otherwise an orphaned worker keeps the port busy
+    def run():
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os._exit(0)
+
+    threading.Thread(target=run, name="parent-watch", daemon=True).start()
+
+
+def _run_worker(config, sock, index, init_worker, parent_pid):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _watch_parent(parent_pid)
+    os.environ["AUTOSUBS_WORKER"] = str(index)
+    try:
+        if init_worker is not None:
+            init_worker(index)
+        uvicorn.Server(config).run(sockets=[sock])
+    except Exception:
+        log.exception(f"Worker {index} crashed")
+        os._exit(1)
+    os._exit(0)
+
+
+def serve(app, host, port, workers, preload=None, init_worker=None, log_level="info"):
+    """
+    Preload in this process, fork `workers` copies of the app on one socket
+    and restart any worker that exits until the parent is stopped.
+    """
+    if preload is not None:
+        preload()
+
+    config = uvicorn.Config(app, host=host, port=port, log_level=log_level)
+    # Logs "Uvicorn running on ...", which the app waits for
+    sock = config.bind_socket()
+
+    parent_pid = os.getpid()
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock, index, init_worker, parent_pid)
+        children[pid] = (index, time.monotonic())
+        log.info(f"Started worker {index} (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(workers):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        if pid not in children:
+            continue
+        index, started = children.pop(pid)
+        if stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        log.warning(f"Worker {index} (pid {pid}) exited with {code}, restarting")
+        # Do not spin if a worker fails right at startup
+        uptime = time.monotonic() - started
+        if uptime < MIN_UPTIME:
+            time.sleep(MIN_UPTIME - uptime)
+        if not stopping:
+            spawn(index)
+
+    sock.close()
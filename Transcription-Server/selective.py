@@ -0,0 +1,90 @@
+"""
+Selective re-decoding: a fast model transcribes the whole file, and only
+the segments it is unsure about are decoded again with the accurate model
+and spliced back into the result.
+
+A segment is unsure when its words are unlikely on average or when its
+text compresses too well (gzip ratio), which is how Whisper's repetition
+loops show up.
+"""
+import os
+
+SAMPLE_RATE = 16000
+
+MIN_WORD_PROBABILITY = float(os.environ.get("AUTOSUBS_REDECODE_MIN_PROBABILITY", "0.6"))
+MAX_COMPRESSION_RATIO = float(os.environ.get("AUTOSUBS_REDECODE_MAX_COMPRESSION", "2.4"))
+# Audio kept around a span so words at its edges are not cut (seconds)
+SPAN_PADDING = 0.2
+# Spans closer than this are decoded together, short decodes lack context
+MERGE_GAP = 1.0
+
+
+def low_confidence(segment, min_probability=MIN_WORD_PROBABILITY, max_compression=MAX_COMPRESSION_RATIO):
+    if segment.compression_ratio is not None and segment.compression_ratio > max_compression:
+        return True
+    words = segment.words or []
+    if not words:
+        return False
+    return sum(word.probability for word in words) / len(words) < min_probability
+
+
+def redecode_spans(segments, duration, padding=SPAN_PADDING, merge_gap=MERGE_GAP):
+    """
+    (start, end, indices) of the time spans to decode again, covering runs
+    of low confidence segments, merged when they are close together.
+    """
+    spans = []
+    for index, segment in enumerate(segments):
+        if not low_confidence(segment):
+            continue
+        start = max(0.0, segment.start - padding)
+        end = min(duration, segment.end + padding)
+        if spans and start - spans[-1][1] < merge_gap:
+            # Segments in between are decoded again too
+            first = spans[-1][2][0]
+            spans[-1] = (spans[-1][0], end, list(range(first, index + 1)))
+        else:
+            spans.append((start, end, [index]))
+    return spans
+
+
+def clip_segments(segments, start, end):
+    """
+    Segment dicts cut down to the words whose middle lies within start and
+    end, with their times kept inside. Segments left without words are dropped.
+    """
+    clipped = []
+    for segment in segments:
+        words = segment.get("words")
+        if not words:
+            if start <= (segment["start"] + segment["end"]) / 2 <= end:
+                clipped.append(dict(segment, start=max(segment["start"], start), end=min(segment["end"], end)))
+            continue
+        words = [dict(word, start=max(word["start"], start), end=min(word["end"], end))
+                 for word in words if start <= (word["start"] + word["end"]) / 2 <= end]
+        if not words:
+            continue
+        clipped.append(dict(segment, words=words, start=words[0]["start"], end=words[-1]["end"],
+                            text="".join(word["word"] for word in words)))
+    return clipped
+
+
+def splice(segments, spans, replacements):
+    """
+    Segment dicts with the segments of each span replaced by its re-decoded
+    segments. The padding decoded with a span belongs to its neighbours, so
+    re-decoded words are kept only within the segments they replace.
+    """
+    replaced = {index: n for n, (_, _, indices) in enumerate(spans) for index in indices}
+    result = []
+    done = set()
+    for index, segment in enumerate(segments):
+        n = replaced.get(index)
+        if n is None:
+            result.append(segment)
+        elif n not in done:
+            done.add(n)
+            indices = spans[n][2]
+            result.extend(clip_segments(replacements[n], segments[indices[0]]["start"],
+                                        segments[indices[-1]]["end"]))
+    return result
@@ -5,42 +5,55 @@ import os
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 os.environ['PYTHONUTF8'] = '1'
 
-class Unbuffered(object):
-    def __init__(self, stream):
-        self.stream = stream
-
-    def write(self, data):
-        if self.stream:
-            self.stream.write(data)
-            self.stream.flush()
-
-    def writelines(self, datas):
-        if self.stream:
-            self.stream.writelines(datas)
-            self.stream.flush()
-
-    def __getattr__(self, attr):
-        return getattr(self.stream, attr)
-
 # Reconfigure stdout and stderr to use UTF-8 encoding before wrapping
 sys.stdout.reconfigure(encoding='utf-8')
 sys.stderr.reconfigure(encoding='utf-8')
 
-# Ensure stdout and stderr are line-buffered after reconfiguration
-sys.stdout = Unbuffered(sys.stdout)
-sys.stderr = Unbuffered(sys.stderr)
+# Route logs and stdout/stderr through a background writer thread so that
+# output never blocks the inference thread on a flush
+from logger import setup_logging, get_logger, job_id_var, verbose_enabled, ProgressReporter
+setup_logging()
+log = get_logger()
 
 from fastapi.middleware.cors import CORSMiddleware
 import json
-import random
 import uvicorn
 from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, status, Header
+from fastapi.responses import StreamingResponse
 import asyncio
 import appdirs
 import time
+import uuid
+import hashlib
+import importlib
+import threading
+import contextlib
+import itertools
+import math
 import platform
-import stable_whisper
+import numpy as np
+from typing import List, Optional
+from postprocess import sanitize_result, merge_diarisation, modify_result, shift_segments
+from audio import get_audio_duration, decode_audio
+from audio_cache import AudioCache
+import model_cache
+from model_cache import get_whisper_model, get_diarization_pipeline, diarization_lock
+from calibration import Calibration
+from cpu_budget import CpuBudget
+from model_usage import ModelUsage
+from hf_index import HfCacheIndex
+from model_store import ModelStore
+from alignment import align_result, silence_chunks
+from decoding import PROFILES, DEFAULT_PROFILE, profile_options
+from language_id import LanguageCache, audio_hash, speech_windows, detect_language
+from jobs import JobRegistry
+from selective import redecode_spans, splice
+from planner import JobStats, Planner, PeakMemory
+from stages import StageScheduler, parse_sizes
+from checkpoints import (CheckpointStore, CHECKPOINT_MIN_SECONDS, checkpoint_key, chunk_bounds,
+                         diarization_turns, restore_diarization)
+import prefork
 
 architecture = platform.machine()
 
@@ -49,7 +62,7 @@ if architecture.startswith("arm") or architecture.startswith("aarch"):
 elif architecture in ["i386", "x86", "x86_64", "amd64"]:
     architecture = "x86"
 else:
-    print(f"Unknown architecture: {architecture}")
+    log.warning(f"Unknown architecture: {architecture}")
 
 # Define a base cache directory using appdirs
 if platform.system() == 'Windows':
@@ -57,30 +70,87 @@ if platform.system() == 'Windows':
 else:
     cache_dir = appdirs.user_cache_dir("AutoSubs", "")
 
-# Matplotlib cache directory
+# Cache directories for the libraries, the variables have to be set before
+# they are imported. The directories are created by prepare_environment().
 matplotlib_cache_dir = os.path.join(cache_dir, 'matplotlib_cachedir')
-os.makedirs(matplotlib_cache_dir, exist_ok=True)
 os.environ['MPLCONFIGDIR'] = matplotlib_cache_dir
 
-# Hugging Face cache directory
 huggingface_cache_dir = os.path.join(cache_dir, 'hf_cache')
-os.makedirs(huggingface_cache_dir, exist_ok=True)
 os.environ['HF_HUB_CACHE'] = huggingface_cache_dir
 os.environ['HF_HOME'] = huggingface_cache_dir
 
-# Torch cache directory
 pyannote_cache_dir = os.path.join(cache_dir, 'pyannote_cache')
-os.makedirs(pyannote_cache_dir, exist_ok=True)
 os.environ['PYANNOTE_CACHE'] = pyannote_cache_dir
 
-# Print paths to verify
-print(f"Matplotlib cache directory: {matplotlib_cache_dir}")
-print(f"Hugging Face cache directory: {huggingface_cache_dir}")
-print(f"Torch cache directory: {pyannote_cache_dir}")
+# Per-host compute_type/thread settings measured for each model
+calibration = Calibration(os.path.join(cache_dir, 'calibration.json'))
+auto_calibrate = os.environ.get("AUTOSUBS_AUTO_CALIBRATE", "1") != "0"
+
+# Repos present in hf_cache, so availability checks need no hub calls
+hf_index = HfCacheIndex(huggingface_cache_dir)
+
+# Verified local copies of the faster-whisper models, loaded without a hub lookup
+model_store = ModelStore(os.path.join(cache_dir, 'model_store')) \
+    if os.environ.get("AUTOSUBS_MODEL_STORE", "1") != "0" else None
+
+# Which models the jobs use, to warm the likely next one at startup
+model_usage = ModelUsage(os.path.join(cache_dir, 'model_usage.json'))
+warm_up_enabled = os.environ.get("AUTOSUBS_WARMUP", "1") != "0"
+
+# Decoded audio, reused by retries and by every stage of a job
+audio_cache = AudioCache(os.path.join(cache_dir, 'audio_cache'),
+                         int(os.environ.get("AUTOSUBS_AUDIO_CACHE_MB", "2048")) * 1024 * 1024)
+
+# Language of "auto" jobs found by a short pre-pass with a small model,
+# remembered per audio content
+language_cache = LanguageCache(os.path.join(cache_dir, 'language_cache.json'))
+language_id_enabled = os.environ.get("AUTOSUBS_LANGUAGE_ID", "1") != "0"
+language_id_model = os.environ.get("AUTOSUBS_LANGUAGE_ID_MODEL", "tiny")
+language_id_threshold = float(os.environ.get("AUTOSUBS_LANGUAGE_ID_THRESHOLD", "0.5"))
+
+# Background jobs (progressive transcription) and their status snapshots
+jobs = JobRegistry(os.path.join(cache_dir, 'jobs'))
+
+# Finished chunks and diarization of long jobs, to resume them after a crash
+checkpoints = CheckpointStore(os.path.join(cache_dir, 'checkpoints'))
+
+# Measured stage speeds of finished jobs, to predict job durations
+planner = Planner(JobStats(os.path.join(cache_dir, 'job_stats.json')), calibration)
+
+
+def planner_model(key):
+    """Model name and planner device of a model_cache key."""
+    if key[0] == "pyannote":
+        device = str(key[2])
+        return "pyannote", "mlx" if device == "mps" else device
+    return key[1], str(key[2])
+
+
+def record_model_load(key, seconds, added_mb):
+    model, device = planner_model(key)
+    planner.record_load(model, device, seconds, added_mb)
+
+model_cache.add_load_listener(record_model_load)
 
-from huggingface_hub import HfApi, HfFolder, login, snapshot_download
-from huggingface_hub.utils import RepositoryNotFoundError, HfHubHTTPError
-import torch
+
+def resident_for_planner():
+    return {planner_model((entry["backend"], entry["model"], entry["device"]))[0]
+            for entry in model_cache.resident_models()}
+
+# Cores shared between the stages running at the same time
+cpu_budget = CpuBudget()
+
+# A bounded pool per pipeline stage, the stages of different jobs overlap
+stage_scheduler = StageScheduler(parse_sizes(os.environ.get("AUTOSUBS_STAGE_POOLS", "")))
+
+def apply_torch_threads(budget):
+    # torch's intra-op pool is process wide, size it to the diarization share
+    import torch
+    threads = budget.threads_for("diarize")
+    if threads:
+        torch.set_num_threads(threads)
+
+cpu_budget.add_listener(apply_torch_threads)
 
 if getattr(sys, 'frozen', False):
     base_path = sys._MEIPASS
@@ -101,7 +171,75 @@ else:
 
 os.environ["PATH"] = ffmpeg_path + os.pathsep + os.environ["PATH"]
 
-app = FastAPI()
+# Heavy libraries in import order, with the seconds each took once loaded.
+# They are imported in the background after the port is bound so the app
+# can connect right away; /ready/ reports the progress.
+subsystems = {"huggingface_hub": None, "torch": None, "stable_whisper": None}
+subsystems_lock = threading.Lock()
+environment_ready = False
+started_at = time.time()
+
+
+def prepare_environment():
+    global environment_ready
+    for directory in (matplotlib_cache_dir, huggingface_cache_dir, pyannote_cache_dir):
+        os.makedirs(directory, exist_ok=True)
+    log.info(f"Matplotlib cache directory: {matplotlib_cache_dir}")
+    log.info(f"Hugging Face cache directory: {huggingface_cache_dir}")
+    log.info(f"Torch cache directory: {pyannote_cache_dir}")
+    environment_ready = True
+
+
+def configure_torch():
+    import torch
+    # pyannote gains little from inter-op parallelism, keep that pool small so
+    # it does not compete with the budgeted intra-op threads. This can only be
+    # set before torch runs any parallel work.
+    try:
+        torch.set_num_interop_threads(min(2, cpu_budget.total))
+    except RuntimeError:
+        pass
+
+
+def load_subsystems():
+    """Import the heavy libraries (once), waits if another thread is doing it."""
+    with subsystems_lock:
+        if not environment_ready:
+            prepare_environment()
+        for name, seconds in subsystems.items():
+            if seconds is not None:
+                continue
+            start = time.perf_counter()
+            importlib.import_module(name)
+            if name == "torch":
+                configure_torch()
+            subsystems[name] = round(time.perf_counter() - start, 3)
+            log.debug(f"Loaded {name} in {subsystems[name]}s")
+
+
+def load_subsystems_in_background():
+    def run():
+        try:
+            load_subsystems()
+            log.info(f"Ready after {time.time() - started_at:.2f}s")
+        except Exception as e:
+            # Requests retry the import and report the error themselves
+            log.exception(f"Loading subsystems failed: {e}")
+            return
+        if warm_up_enabled:
+            warm_up()
+
+    threading.Thread(target=run, name="load-subsystems", daemon=True).start()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    load_subsystems_in_background()
+    yield
+    stage_scheduler.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware to allow requests from your frontend
 app.add_middleware(
@@ -140,33 +278,23 @@ mac_models = {
     "large.de": "mlx-community/whisper-large-v3-turbo-german-f16",
 }
 
-def sanitize_result(result):
-    # Convert the result to a JSON string
-    result_json = json.dumps(result, default=lambda o: None)
-    # Parse the JSON string back to a dictionary
-    sanitized_result = json.loads(result_json)
-    return sanitized_result
+# Model sizes from the most to the least accurate
+model_sizes = ["large", "medium", "small", "base", "tiny"]
 
-def is_model_cached_locally(model_id, revision=None):
-    try:
-        snapshot_download(
-            repo_id=model_id,
-            revision=revision,  # Model version - use the latest revision if not specified
-            local_files_only=True,
-            allow_patterns=["*"],
-        )
-        return True
-    except Exception:
-        return False
+def is_model_cached_locally(model_id, revision=None, filename=None):
+    # Answered from the index of hf_cache instead of probing with snapshot_download
+    return hf_index.is_cached(model_id, revision=revision, filename=filename)
 
 
 def is_model_accessible(model_id, token=None, revision=None):
+    from huggingface_hub import snapshot_download
+    from huggingface_hub.utils import RepositoryNotFoundError, HfHubHTTPError
     # First, check if the model is cached locally
     if is_model_cached_locally(model_id, revision=revision):
-        print(f"Model '{model_id}' is cached locally.")
+        log.info(f"Model '{model_id}' is cached locally.")
         return True  # Model is cached locally and accessible
 
-    print(
+    log.info(
         f"Model '{model_id}' is not cached locally. Checking online access...")
 
     try:
@@ -182,19 +310,18 @@ def is_model_accessible(model_id, token=None, revision=None):
         )
         return True  # The model is accessible
     except RepositoryNotFoundError:
-        print(f"Model '{model_id}' does not exist.")
+        log.warning(f"Model '{model_id}' does not exist.")
         return False
     except HfHubHTTPError as e:
         if e.response.status_code == 403:
-            print(f"Access denied to model '{
-                  model_id}'. You may need to accept the model's terms or provide a valid token.")
+            log.warning(f"Access denied to model '{model_id}'. You may need to accept the model's terms or provide a valid token.")
         elif e.response.status_code == 401:
-            print(f"Unauthorized access. Please check your Hugging Face access token.")
+            log.warning("Unauthorized access. Please check your Hugging Face access token.")
         else:
-            print(f"An HTTP error occurred: {e}")
+            log.error(f"An HTTP error occurred: {e}")
         return False
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        log.error(f"An unexpected error occurred: {e}")
         return False
 
 # Function for transcribing the audio
@@ -202,13 +329,15 @@ def is_model_accessible(model_id, token=None, revision=None):
 
 def inference(audio, **kwargs) -> dict:
     import mlx_whisper
+    import stable_whisper
     if kwargs["language"] == "auto":
         output = mlx_whisper.transcribe(
             audio,
             path_or_hf_repo=kwargs["model"],
             word_timestamps=True,
-            verbose=True,
-            task=kwargs["task"]
+            verbose=True if kwargs["verbose"] else None,
+            task=kwargs["task"],
+            **profile_options(kwargs["profile"], backend="mlx")
         )
     else:
         output = mlx_whisper.transcribe(
@@ -216,277 +345,472 @@ def inference(audio, **kwargs) -> dict:
             path_or_hf_repo=kwargs["model"],
             word_timestamps=True,
             language=kwargs["language"],
-            verbose=True,
-            task=kwargs["task"]
+            verbose=True if kwargs["verbose"] else None,
+            task=kwargs["task"],
+            **profile_options(kwargs["profile"], backend="mlx")
         )
     return stable_whisper.result.WhisperResult(result=output, force_order=True)
 
 
-def log_progress(seek, total_duration):
-    # print progress as percentage
-    print(f"Progress: {seek/total_duration*100:.0f}%")
-
-
-async def transcribe_audio(audio_file, kwargs, subtitle_settings):
+def whisper_model_path(model_id):
+    """Directory to load a faster-whisper model from, or its name if the store is off."""
+    if model_store is None:
+        return None
+    try:
+        return model_store.path(model_id)
+    except Exception as e:
+        log.warning(f"Model store unavailable for {model_id}, loading it by name: {e}")
+        return None
+
+
+def whisper_settings(kwargs):
+    """compute_type and thread count for a faster-whisper model on this host."""
+    compute_type = "float16" if kwargs["device"] == "cuda" else "int8"
+    cpu_threads = kwargs.get("cpu_threads", 0)
+    tuned = calibration.get(kwargs["model"]) if kwargs["device"] == "cpu" else None
+    if tuned is not None:
+        compute_type = tuned["compute_type"]
+        # an explicit thread budget (batch items) takes precedence
+        if cpu_threads == 0:
+            cpu_threads = tuned["cpu_threads"]
+    return compute_type, cpu_threads, tuned
+
+
+def identify_language(audio, device):
+    """
+    Language of decoded audio from a few speech windows, or None when the
+    detection is not confident. Results are cached per audio hash.
+    """
+    key = audio_hash(audio)
+    entry = language_cache.get(key)
+    if entry is None:
+        start = time.time()
+        windows = speech_windows(audio)
+        if not windows:
+            return None
+        model_id = win_models[language_id_model]
+        model = get_whisper_model(model_id, device, "float16" if device == "cuda" else "int8",
+                                  model_path=whisper_model_path(model_id), pin=True)
+        with model_cache.in_use(model, pinned=True):
+            language, probability = detect_language(model, windows)
+        language_cache.put(key, language, probability, model_id)
+        entry = language_cache.get(key)
+        log.info(f"Detected language {language} ({probability:.2f}) from {len(windows)} windows "
+                 f"in {time.time() - start:.1f}s")
+    if entry["probability"] < language_id_threshold:
+        return None
+    return entry["language"]
+
+
+def decode_selectively(fast_model, model, audio, kwargs, options, verbose, progress):
+    """
+    Transcribe with the fast model, then decode the low confidence spans
+    again with the accurate model. Returns the spliced result and a report.
+    """
+    import stable_whisper
+    start = time.time()
+    first = fast_model.transcribe_stable(
+        audio, language=kwargs.get("detected_language") if kwargs["language"] == "auto" else kwargs["language"],
+        task=kwargs["task"], regroup=True, verbose=verbose, vad_filter=True,
+        progress_callback=progress, **options)
+    fast_seconds = time.time() - start
+
+    duration = len(audio) / 16000
+    spans = redecode_spans(first.segments, duration)
+    replacements = []
+    start = time.time()
+    for span_start, span_end, _ in spans:
+        part = model.transcribe_stable(
+            audio[int(span_start * 16000):int(span_end * 16000)], language=first.language, task=kwargs["task"],
+            regroup=True, verbose=verbose, vad_filter=True, **options)
+        replacements.append(shift_segments(part.segments_to_dicts(), span_start))
+    redecode_seconds = time.time() - start
+
+    result = stable_whisper.WhisperResult({
+        "segments": splice(first.segments_to_dicts(), spans, replacements),
+        "language": first.language,
+    })
+    # Seconds of speech the fast model found, the whole file if it found none
+    speech = sum(segment.duration for segment in first.segments) or duration
+    redecoded_spans_seconds = [end - begin for begin, end, _ in spans]
+    redecoded = sum(redecoded_spans_seconds)
+
+    def windows(lengths):
+        return sum(math.ceil(length / 30) for length in lengths)
+
+    report = {
+        "fast_model": kwargs["fast_model"],
+        "model": kwargs["model"],
+        "segments": len(first.segments),
+        "redecoded_segments": sum(len(indices) for _, _, indices in spans),
+        "redecoded_spans": len(spans),
+        "redecoded_fraction": round(min(1.0, redecoded / speech), 4) if speech else 0.0,
+        "redecoded_seconds": round(redecoded, 3),
+        "fast_seconds": round(fast_seconds, 3),
+        "redecode_seconds": round(redecode_seconds, 3),
+        # Against the accurate model decoding all the speech at the speed it
+        # had on the spans, only known once something was decoded again.
+        # Whisper decodes whole 30 s windows, so the cost scales with those
+        "estimated_speedup": round(redecode_seconds / windows(redecoded_spans_seconds) * windows([speech])
+                                   / (fast_seconds + redecode_seconds), 2) if spans else None,
+    }
+    log.info(f"Re-decoded {report['redecoded_segments']}/{report['segments']} segments "
+             f"({report['redecoded_fraction']:.0%} of the speech) with {kwargs['model']}, "
+             f"estimated speedup {report['estimated_speedup']}")
+    return result, report
+
+
+def transcribe_audio(audio_file, kwargs):
+    """
+    The inference stage: returns the stable-ts result, the faster-whisper
+    model that made it (None with mlx), stage timings and the selective report.
+    """
+    # Per-segment output is opt-in, otherwise stable-ts stays silent (None)
+    # and progress is reported through the rate-limited logger
+    verbose = True if kwargs["verbose"] else None
+    # Shared by the chunks of a checkpointed job (transcribe_chunks)
+    progress = kwargs.get("progress") or ProgressReporter(log)
+    timings = {}
+    selective = None
     if (architecture == 'x86'):
-        compute_type = "float16" if kwargs["device"] == "cuda" else "int8"
-        model = stable_whisper.load_faster_whisper(kwargs["model"], device=kwargs["device"], compute_type=compute_type)
-        if kwargs["language"] == "auto":
-            result = model.transcribe_stable(
-                audio_file, task=kwargs["task"], regroup=True, verbose=True, vad_filter=True, progress_callback=log_progress)
+        compute_type, cpu_threads, tuned = whisper_settings(kwargs)
+        # On CPU the thread count is part of the model cache key, so it is
+        # never resized: the lease waits until the budget has room. Without a
+        # calibrated count it is every core, or half of them next to a
+        # diarization (a second copy of the model, loaded once)
+        if kwargs["device"] == "cpu":
+            budget = cpu_budget.lease("transcribe", job_id_var.get(), desired=cpu_threads or None)
         else:
-            result = model.transcribe_stable(
-                audio_file, language=kwargs["language"], task=kwargs["task"], regroup=True, verbose=True, vad_filter=True, progress_callback=log_progress)
-            model.align(audio_file, result, kwargs["language"])
-            if kwargs["align_words"]:
-                model.align_words(audio_file, result, kwargs["language"])
+            budget = contextlib.nullcontext()
+        with budget as lease:
+            options = profile_options(kwargs["profile"])
+            if kwargs.get("batch_size", 0) > 1:
+                # stable-ts hands the VAD segments to faster-whisper's
+                # BatchedInferencePipeline, decoding batch_size windows per pass
+                options["batch_size"] = kwargs["batch_size"]
+            if kwargs.get("initial_prompt") and options.get("condition_on_previous_text"):
+                # A chunk of a longer file continues from the text before it
+                options["initial_prompt"] = kwargs["initial_prompt"]
+            # Handed out marked in use, nothing can unload it before the block
+            model = get_whisper_model(
+                kwargs["model"],
+                kwargs["device"],
+                compute_type,
+                cpu_threads=lease.threads if lease is not None else cpu_threads,
+                num_workers=kwargs.get("num_workers", 1),
+                model_path=whisper_model_path(kwargs["model"]),
+                pin=True,
+            )
+            start = time.time()
+            with model_cache.in_use(model, pinned=True):
+                if kwargs.get("fast_model"):
+                    # Selective mode: the requested model only decodes what
+                    # the fast model was unsure about
+                    fast_compute_type, _, _ = whisper_settings(dict(kwargs, model=kwargs["fast_model"]))
+                    if not isinstance(audio_file, np.ndarray):
+                        audio_file = decode_audio(audio_file)
+                    fast_model = get_whisper_model(
+                        kwargs["fast_model"],
+                        kwargs["device"],
+                        fast_compute_type,
+                        cpu_threads=lease.threads if lease is not None else cpu_threads,
+                        num_workers=kwargs.get("num_workers", 1),
+                        model_path=whisper_model_path(kwargs["fast_model"]),
+                        pin=True,
+                    )
+                    with model_cache.in_use(fast_model, pinned=True):
+                        result, selective = decode_selectively(fast_model, model, audio_file, kwargs, options, verbose, progress)
+                elif kwargs["language"] == "auto":
+                    # A language found by the pre-pass skips detection in the decode
+                    if kwargs.get("detected_language"):
+                        options["language"] = kwargs["detected_language"]
+                    result = model.transcribe_stable(
+                        audio_file, task=kwargs["task"], regroup=True, verbose=verbose, vad_filter=True, progress_callback=progress, **options)
+                else:
+                    result = model.transcribe_stable(
+                        audio_file, language=kwargs["language"], task=kwargs["task"], regroup=True, verbose=verbose, vad_filter=True, progress_callback=progress, **options)
+                timings["transcribe"] = round(time.time() - start, 3)
+        if kwargs["device"] == "cpu" and tuned is None and auto_calibrate:
+            # First use of this model on this host, measure it once it is
+            # downloaded, in the gaps between jobs
+            calibration.calibrate_in_background(kwargs["model"], cpu_budget)
     else: # Use Whisper MLX on MacOS
+        import stable_whisper
+        model = None
+        start = time.time()
         result = stable_whisper.transcribe_any(
             inference, audio_file, inference_kwargs=kwargs, vad=False, regroup=True)
-
+        timings["transcribe"] = round(time.time() - start, 3)
+    return result, model, timings, selective
+
+
+def align_audio(model, audio_file, result, kwargs):
+    """Word alignment of a transcription, with the model that made it."""
+    # align() used to run over the whole file as well, but its result was
+    # never used; word alignment is the one pass left
+    if not isinstance(audio_file, np.ndarray):
+        audio_file = decode_audio(audio_file)
+    pinned = model is None
+    if pinned:
+        # Every chunk came from a checkpoint, nothing loaded the model yet
+        compute_type, cpu_threads, _ = whisper_settings(kwargs)
+        if kwargs["device"] == "cpu":
+            cpu_threads = cpu_budget.size(cpu_threads)
+        model = get_whisper_model(kwargs["model"], kwargs["device"], compute_type, cpu_threads=cpu_threads,
+                                  num_workers=kwargs.get("num_workers", 1),
+                                  model_path=whisper_model_path(kwargs["model"]), pin=True)
+    with model_cache.in_use(model, pinned=pinned):
+        return align_result(model, audio_file, result, kwargs["language"],
+                            verbose=True if kwargs["verbose"] else None)
+
+
+def finish_transcript(result, timings, selective, subtitle_settings):
     result = modify_result(result, **subtitle_settings)
 
-    return result.to_dict()
-
-
-async def diarize_audio(audio_file, device, speaker_count):
-    from pyannote.audio import Pipeline
-    print("Starting diarization...")
+    transcript = result.to_dict()
+    transcript["timings"] = timings
+    if selective is not None:
+        transcript["selective"] = selective
+    return transcript
+
+
+def open_checkpoint(audio, kwargs):
+    """
+    Checkpoint of a long job on decoded audio, None for short ones. Its
+    diarization is always kept; the transcription is cut into chunks only
+    if the request asked for it, otherwise it is one chunk of the whole file.
+    """
+    if not isinstance(audio, np.ndarray) or len(audio) < CHECKPOINT_MIN_SECONDS * 16000:
+        return None
+    # Everything that changes the decoded text, alignment runs after the chunks
+    settings = {name: kwargs.get(name) for name in (
+        "model", "task", "language", "detected_language", "profile", "batch_size", "fast_model")}
+    key = checkpoint_key(audio_hash(audio), settings)
+    bounds = chunk_bounds(audio) if kwargs["checkpoint"] else [(0.0, len(audio) / 16000)]
+    return checkpoints.open(key, bounds, settings)
+
+
+async def transcribe_chunks(audio, kwargs, checkpoint):
+    """
+    transcribe_audio() chunk by chunk, saving each chunk to the checkpoint
+    and skipping the chunks it already holds.
+    """
+    import stable_whisper
+    # One reporter over the whole file, the app reads "Progress: N%" as the job's
+    kwargs = dict(kwargs, progress=ProgressReporter(log, total=len(audio) / 16000))
+    segments = []
+    language = None
+    model = None
+    reports = []
+    elapsed = 0.0
+    for index, (start, end) in enumerate(checkpoint.bounds):
+        done = checkpoint.chunk(index)
+        if done is None:
+            if language and kwargs["language"] == "auto":
+                # The first chunk settled the language for the rest
+                kwargs["detected_language"] = language
+            kwargs["progress"].offset = start
+            if segments:
+                kwargs["initial_prompt"] = " ".join(s["text"].strip() for s in segments[-5:])[-200:]
+            result, model, timings, report = await stage_scheduler.run(
+                "transcribe", transcribe_audio, audio[int(start * 16000):int(end * 16000)], kwargs)
+            elapsed += timings["transcribe"]
+            if report is not None:
+                reports.append(report)
+            done = {"segments": shift_segments(result.segments_to_dicts(), start), "language": result.language}
+            await stage_scheduler.run("write", checkpoint.save_chunk, index, done["segments"], done["language"])
+            log.info(f"Checkpointed chunk {index + 1}/{len(checkpoint.bounds)} ({start:.0f}-{end:.0f}s)")
+        language = language or done["language"]
+        segments.extend(done["segments"])
+    result = stable_whisper.WhisperResult({"segments": segments, "language": language})
+    selective = reports[0] if len(reports) == 1 else ({"chunks": reports} if reports else None)
+    return result, model, {"transcribe": round(elapsed, 3)}, selective
+
+
+async def transcribe_stages(audio, kwargs, subtitle_settings, checkpoint=None):
+    """Transcribe, align and regroup, each in the pool of its stage."""
+    if checkpoint is not None:
+        result, model, timings, selective = await transcribe_chunks(audio, kwargs, checkpoint)
+    else:
+        result, model, timings, selective = await stage_scheduler.run("transcribe", transcribe_audio, audio, kwargs)
+    if architecture == "x86" and kwargs["language"] != "auto" and kwargs["align_words"]:
+        result, elapsed = await stage_scheduler.run("align", align_audio, model, audio, result, kwargs)
+        timings["align"] = round(elapsed, 3)
+    transcript = await stage_scheduler.run("merge", finish_transcript, result, timings, selective, subtitle_settings)
+    if checkpoint is not None:
+        transcript["checkpoint"] = {"chunks": len(checkpoint.bounds), "resumed_chunks": checkpoint.resumed}
+    return transcript
+
+
+def diarize_audio(audio_file, device, speaker_count, lease=None):
+    log.info("Starting diarization...")
     try:
-        pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1")
-        pipeline.to(device)
-        if speaker_count > 0:
-            return pipeline(audio_file, num_speakers=speaker_count)
-        else:
-            return pipeline(audio_file)
-    except Exception as e:
-        error_message = f"failed to load diarization model. {e}"
-        print(error_message)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=error_message
-        )
-
-def merge_diarisation(transcript, diarization):
-    # Array of colors to choose from
-    colors = ['#0062ec', '#ed63d4', '#8b5eed', '#1a8bed', '#308800',
-              '#886d4e', '#cb0000', '#6cb18c', '#d57312', '#000000']
-
-    # Dictionary to store speaker information
-    speakers_info = {}
-    speaker_counter = 1
-
-    # Match speakers to transcript segments
-    new_segments = []
-    transcript_segments = transcript["segments"]
-    diarization_turns = list(diarization.itertracks(yield_label=True))
-    diarization_segments = []
-
-    i, j = 0, 0
-    while i < len(transcript_segments) and j < len(diarization_turns):
-        segment = transcript_segments[i]
-        turn, _, speaker = diarization_turns[j]
-
-        segment_start = segment["start"]
-        segment_end = segment["end"]
-        diar_start = turn.start
-        diar_end = turn.end
-
-        if diar_end <= segment_start:
-            j += 1
-        elif segment_end <= diar_start:
-            i += 1
-        elif segment_end - diar_end >= diar_end - segment_start and j < len(diarization_turns):
-            j += 1
-        else:
-            # Overlapping segment
-            speaker_label = f"Speaker {
-                speaker_counter}" if speaker not in speakers_info else speakers_info[speaker]["label"]
-            new_segment = {
-                "start": segment_start,
-                "end": segment_end,
-                "speaker": speaker_label,
-                "text": segment["text"],
-                "words": segment["words"]
-            }
-            new_segments.append(new_segment)
-
-            diarization_segments.append({
-                "speaker": speaker_label,
-                "start": diar_start,
-                "end": diar_end
-            })
-
-            # Add speaker info if not already present
-            if speaker not in speakers_info:
-                # Select a random color and remove it from the list to avoid duplicates
-                if colors:
-                    color = random.choice(colors)
-                    colors.remove(color)
-                else:
-                    # Generate a random color if we've run out
-                    color = "#{:06x}".format(random.randint(0, 0xFFFFFF))
-                # Store speaker information
-                speakers_info[speaker] = {
-                    "label": speaker_label,
-                    "id": speaker_label,
-                    "color": color,
-                    "style": "Outline",
-                    "sample": {
-                        "start": segment_start,
-                        "end": segment_end
-                    },
-                    "subtitle_lines": 0,
-                    "word_count": 0
-                }
-                speaker_counter += 1
-            # Update speaker's subtitle lines and word count
-            speakers_info[speaker]["subtitle_lines"] += 1
-            speakers_info[speaker]["word_count"] += len(segment["words"])
-            i += 1  # Move to the next transcript segment
-
-    # Assign 'Unknown' speaker to any remaining transcript segments
-    for segment in transcript_segments[i:]:
-        new_segment = {
-            "start": segment["start"],
-            "end": segment["end"],
-            "speaker": "Unknown",
-            "text": segment["text"],
-            "words": segment["words"]
-        }
-        new_segments.append(new_segment)
-
-        # Add 'Unknown' speaker info if not already present
-        if "Unknown" not in speakers_info:
-            if colors:
-                color = random.choice(colors)
-                colors.remove(color)
+        if isinstance(audio_file, np.ndarray):
+            # Already decoded (16 kHz mono), hand pyannote the waveform
+            import torch
+            audio_file = {"waveform": torch.from_numpy(audio_file)[None], "sample_rate": 16000}
+        try:
+            pipeline = get_diarization_pipeline(device, pin=True)
+        except Exception as e:
+            error_message = f"failed to load diarization model. {e}"
+            log.error(error_message)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=error_message
+            )
+        with model_cache.in_use(pipeline, pinned=True), diarization_lock:
+            if speaker_count > 0:
+                return pipeline(audio_file, num_speakers=speaker_count)
             else:
-                color = "#{:06x}".format(random.randint(0, 0xFFFFFF))
-            speakers_info["Unknown"] = {
-                "label": "Unknown",
-                "id": "Unknown",
-                "color": color,
-                "style": "outline",
-                "sample": {
-                    "start": segment["start"],
-                    "end": segment["end"]
-                },
-                "subtitle_lines": 0,
-                "word_count": 0
-            }
-        # Update 'Unknown' speaker's subtitle lines and word count
-        speakers_info["Unknown"]["subtitle_lines"] += 1
-        speakers_info["Unknown"]["word_count"] += len(segment["words"])
-
-    # Convert speakers_info dict to a list
-    speakers_list = list(speakers_info.values())
-    top_speaker = max(
-        speakers_list, key=lambda speaker: speaker["subtitle_lines"])
-
-    # Add speakers list to the result
-    result = {
-        "text": transcript["text"],
-        "language": transcript["language"],
-        "speakers": speakers_list,
-        "top_speaker": {
-            "label": top_speaker["label"],
-            "id": top_speaker["id"],
-            "percentage": round((top_speaker["subtitle_lines"] / len(transcript_segments)) * 100)
-        },
-        "segments": new_segments,
-        "diarization": diarization_segments
-    }
-    return result
-
-
-async def process_audio(file_path, kwargs, device, diarize_enabled, speaker_count, subtitle_settings):
-    """Process audio: transcription and diarization concurrently."""
+                return pipeline(audio_file)
+    finally:
+        # Give the cores back as soon as diarization is done
+        if lease is not None:
+            cpu_budget.release(lease)
+
+async def process_audio(audio, kwargs, device, diarize_enabled, speaker_count, subtitle_settings, checkpoint=None):
+    """
+    Process audio (a path or decoded samples): transcription and diarization
+    concurrently, resuming both from checkpoint if one is given.
+    """
     if diarize_enabled:
-        # Run transcription and diarization concurrently
-        transcript, diarization = await asyncio.gather(
-            transcribe_audio(
-                file_path, kwargs, subtitle_settings),
-            diarize_audio(file_path, device, speaker_count)
-        )
+        # Register diarization with the CPU budget before transcription asks
+        # for cores: an uncalibrated transcription then leaves diarization
+        # its share instead of taking every core
+        diarize_lease = cpu_budget.acquire("diarize", job_id_var.get(), elastic=True)
+        diarize_timing = {}
+
+        def diarize():
+            turns = checkpoint.diarization(speaker_count) if checkpoint is not None else None
+            if turns is not None:
+                cpu_budget.release(diarize_lease)
+                return restore_diarization(turns)
+            start = time.time()
+            try:
+                diarization = diarize_audio(audio, device, speaker_count, diarize_lease)
+            finally:
+                diarize_timing["diarize"] = round(time.time() - start, 3)
+            if checkpoint is not None:
+                checkpoint.save_diarization(speaker_count, diarization_turns(diarization))
+            return diarization
+
+        try:
+            # Run transcription and diarization concurrently in their stage pools
+            transcript, diarization = await asyncio.gather(
+                transcribe_stages(audio, kwargs, subtitle_settings, checkpoint),
+                stage_scheduler.run("diarize", diarize)
+            )
+        finally:
+            cpu_budget.release(diarize_lease)
         # Merge diarization with transcription
-        result = merge_diarisation(transcript, diarization)
+        result = await stage_scheduler.run("merge", merge_diarisation, transcript, diarization)
+        result["timings"] = dict(transcript["timings"], **diarize_timing)
+        for name in ("selective", "checkpoint"):
+            if name in transcript:
+                result[name] = transcript[name]
     else:
         # Run transcription only
-        transcript = await transcribe_audio(file_path, kwargs, subtitle_settings)
+        transcript = await transcribe_stages(audio, kwargs, subtitle_settings, checkpoint)
         transcript["speakers"] = []
         result = transcript
 
     return result
 
-def modify_result(result, max_words, max_chars, sensitive_words, remove_punctuation, text_format):
-    (
-        result
-        .split_by_punctuation([('.', ' '), '。', '?', '？', ',', '，'])
-        .split_by_gap(0.4)
-        .merge_by_gap(0.1, max_words=3)
-        .split_by_length(max_words=max_words, max_chars=max_chars)
-    )
-
-    if remove_punctuation:
-        def remove_punctuation_chars(result, seg_idx, word_idx):
-            word_obj = result[seg_idx][word_idx]
-            word_obj.word = word_obj.word.rstrip(r".,\,,?")
-
-        result.custom_operation(
-            key="word",                   # Attribute to evaluate
-            operator="end",               # Match words ending with punctuation
-            value=r"any=.,\,,?",    # Target punctuation characters
-            method=remove_punctuation_chars,  # Custom method
-            word_level=True               # Operate at the word level
-        )
 
-    if text_format == "lowercase":
-        result.custom_operation(
-            key='',  # Use the entire word object
-            operator=lambda word, _: True,  # Always match
-            value=None,  # Placeholder value
-            method=lambda result, seg_idx, word_idx: setattr(
-                result[seg_idx][word_idx], "word", result[seg_idx][word_idx].word.lower()
-            ),
-            word_level=True
-        )
-    elif text_format == "uppercase":
-        result.custom_operation(
-            key='',  # Use the entire word object
-            operator=lambda word, _: True,  # Always match
-            value=None,  # Placeholder value
-            method=lambda result, seg_idx, word_idx: setattr(
-                result[seg_idx][word_idx], "word", result[seg_idx][word_idx].word.upper()
-            ),
-            word_level=True
-        )
+# First pass model of selective re-decoding
+default_fast_model = os.environ.get("AUTOSUBS_FAST_MODEL", "base")
 
-    # matching function to identify sensitive words
-    if len(sensitive_words) > 0:
-        def is_sensitive(word, sensitive_words):
-            return word.word.lower().strip() in [w.lower() for w in sensitive_words]
-        
-        def censor_word(result, seg_index, word_index):
-            word = result[seg_index][word_index]
-            match = word.word.strip()
-            # Replace each character with an asterisk
-            word.word = word.word.replace(match, '*' * len(word.word.strip()))
-
-        result.custom_operation(
-            key='',                      # Empty string to use the word object directly
-            operator=is_sensitive,       # Use the is_sensitive function as the operator
-            value=sensitive_words,       # Pass the sensitive_words list as the value
-            method=censor_word,          # Use the censor_word function to perform the replacement
-            word_level=True              # Operate at the word level
-        )
-        
-    return result
+# Default for TranscriptionRequest.batch_size, overridable per host
+default_batch_size = int(os.environ.get("AUTOSUBS_BATCH_SIZE", "0"))
 
-class TranscriptionRequest(BaseModel):
-    file_path: str
+
+def select_device():
+    import torch
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    elif torch.backends.mps.is_available():
+        return torch.device("mps")
+    else:
+        return torch.device("cpu")
+
+
+def resolve_model(model, language, task):
+    """Map the model size chosen in the app to a backend model id and task."""
+    if language == "en":
+        model = model + ".en"
+        task = "transcribe"
+    elif language == "de" and model == "large" and architecture == "x86":
+        # german model is exclusive to faster whisper (x86)
+        model = model + ".de"
+
+    # windows, or on mac with intel architecture
+    models = win_models if architecture == "x86" else mac_models
+    # no language specific variant of this size: the multilingual model
+    return models.get(model) or models[model.split(".")[0]], task
+
+
+def warm_model(model_id):
+    """Load a model with the settings the next job on an idle server will use."""
+    load_subsystems()
+    if architecture != "x86":
+        import mlx.core as mx
+        from mlx_whisper.transcribe import ModelHolder
+        # mlx_whisper keeps the last model it loaded
+        ModelHolder.get_model(model_id, mx.float16)
+        return
+    import torch
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    compute_type, cpu_threads, _ = whisper_settings({"model": model_id, "device": device})
+    if device == "cpu":
+        # Same thread count as transcribe_audio() loads it with, so the job
+        # hits the cached model instead of loading a differently threaded one
+        cpu_threads = cpu_budget.size(cpu_threads)
+    get_whisper_model(model_id, device, compute_type, cpu_threads=cpu_threads,
+                      model_path=whisper_model_path(model_id))
+
+
+def warm_diarization():
+    load_subsystems()
+    get_diarization_pipeline(select_device())
+
+
+def warm_up():
+    """Load the most used model, and the diarization pipeline if it is used at all."""
+    model_id = model_usage.most_used()
+    diarize_share = model_usage.diarize_share()
+    if model_id is not None:
+        start = time.time()
+        try:
+            warm_model(model_id)
+            log.info(f"Warmed up {model_id} in {time.time() - start:.1f}s")
+        except Exception as e:
+            log.warning(f"Warm-up of {model_id} failed: {e}")
+    if diarize_share > 0:
+        try:
+            warm_diarization()
+        except Exception as e:
+            log.warning(f"Warm-up of the diarization pipeline failed: {e}")
+
+
+def save_result(result, output_dir, timeline):
+    """Write the transcription JSON for a timeline and return its path."""
+    json_filename = f"{timeline}.json"
+    json_filepath = os.path.join(output_dir, json_filename)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Write to a temporary file first so a crash never leaves a partial result
+    tmp_filepath = json_filepath + ".tmp"
+    with open(tmp_filepath, 'w', encoding='utf-8') as f:
+        json.dump(sanitize_result(result), f, indent=4, ensure_ascii=False)
+    os.replace(tmp_filepath, json_filepath)
+
+    log.info(f"Transcription saved to: {json_filepath}")
+    return json_filepath
+
+
+class TranscriptionSettings(BaseModel):
     output_dir: str
-    timeline: str
     model: str
     language: str
     task: str
@@ -498,11 +822,193 @@ class TranscriptionRequest(BaseModel):
     sensitive_words: list
     remove_punctuation: bool
     text_format: str
+    verbose: bool = False
+    # Batched faster-whisper inference (0 or 1 = sequential decoding)
+    batch_size: int = default_batch_size
+    # Decoder settings: fast, balanced or accurate (see decoding.py)
+    profile: str = DEFAULT_PROFILE
+    # Seconds from now the result is needed in: the most accurate model up
+    # to the requested one that is predicted to make it is used
+    deadline_seconds: Optional[float] = None
+    # Transcribe with fast_model and decode only its low confidence spans
+    # again with model (see selective.py)
+    selective: bool = False
+    fast_model: str = default_fast_model
+    # Transcribe files longer than CHECKPOINT_MIN_SECONDS in chunks saved as
+    # they finish, so submitting the job again after a crash resumes it
+    # (see checkpoints.py). The cuts change the decode context a little.
+    # Their diarization is checkpointed either way. The app sends true
+    checkpoint: bool = False
+
+class TranscriptionRequest(TranscriptionSettings):
+    file_path: str
+    timeline: str
     mark_in: int
     mark_out: int
 
+
+async def prepare_transcription(request, cpu_threads=0, num_workers=1, audio=None, record_usage=True):
+    """
+    Audio, transcribe_audio() kwargs and subtitle settings for a request.
+    audio can be the already decoded samples of request.file_path.
+    """
+    if request.profile not in PROFILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown decoding profile: {request.profile}. Use one of: {', '.join(PROFILES)}"
+        )
+    await asyncio.to_thread(load_subsystems)
+    import torch
+    whisper_device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    if architecture != "x86":
+        # mlx_whisper decodes the file itself
+        audio = request.file_path
+    elif audio is None:
+        # Decode once for language detection, transcription and diarization
+        audio = await stage_scheduler.run("decode", audio_cache.load, request.file_path)
+
+    detected_language = None
+    if architecture == "x86" and request.language == "auto" and language_id_enabled:
+        # Knowing the language up front picks the language specific model
+        # (.en, large.de) and spares the main decode its own detection
+        try:
+            # VAD and a short decode, with the other pre-processing
+            detected_language = await stage_scheduler.run("decode", identify_language, audio, whisper_device)
+        except Exception as e:
+            log.warning(f"Language pre-pass failed, the model will detect it: {e}")
+
+    if isinstance(audio, np.ndarray):
+        duration = len(audio) / 16000
+    else:
+        duration = await asyncio.to_thread(get_audio_duration, request.file_path)
+    # Stage speeds are measured per backend device, mlx on macOS
+    planner_device = whisper_device if architecture == "x86" else "mlx"
+    align_words = request.align_words and request.language != "auto"
+
+    model_size = request.model
+    schedule = None
+    if request.deadline_seconds is not None and request.model in model_sizes:
+        sizes = model_sizes[model_sizes.index(request.model):]
+        candidates = [(size, resolve_model(size, detected_language or request.language, request.task)[0])
+                      for size in sizes]
+        resident = resident_for_planner()
+        schedule = planner.choose(candidates, planner_device, duration, request.deadline_seconds,
+                                  request.diarize, align_words, resident, request.profile, request.batch_size)
+        model_size = schedule["size"]
+        schedule.update(
+            requested_model=request.model,
+            deadline_seconds=request.deadline_seconds,
+            predicted_completion=time.strftime("%Y-%m-%dT%H:%M:%S",
+                                               time.localtime(time.time() + schedule["predicted_seconds"])),
+        )
+        log.info(f"Deadline {request.deadline_seconds:.0f}s: using {model_size}, predicted to finish in "
+                 f"{schedule['predicted_seconds']:.0f}s" + ("" if schedule["deadline_met"] else " (too late)"))
+
+    model, task = resolve_model(model_size, detected_language or request.language, request.task)
+    log.info(f"Using model: {model}")
+    fast_model = None
+    if request.selective and architecture == "x86":
+        if request.fast_model not in win_models or "." in request.fast_model:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fast model: {request.fast_model}"
+            )
+        fast_model, _ = resolve_model(request.fast_model, detected_language or request.language, request.task)
+        if fast_model == model:
+            fast_model = None
+        else:
+            log.info(f"Selective re-decoding with {fast_model} first")
+    if record_usage:
+        model_usage.record(model, request.diarize)
+
+    kwargs = {
+        "model": model,
+        "task": task,
+        "language": request.language,
+        "detected_language": detected_language,
+        "align_words": request.align_words,
+        "verbose": verbose_enabled(request.verbose),
+        "device": whisper_device,
+        "cpu_threads": cpu_threads,
+        "num_workers": num_workers,
+        "batch_size": request.batch_size,
+        "profile": request.profile,
+        "fast_model": fast_model,
+        "checkpoint": request.checkpoint,
+        "duration": duration,
+        "planner_device": planner_device,
+        "predicted_seconds": planner.predict(model, planner_device, duration, request.diarize, align_words,
+                                             size=model_size, profile=request.profile,
+                                             batch_size=request.batch_size)["total"],
+        "schedule": schedule,
+    }
+
+    subtitle_settings = {
+        "max_words": request.max_words,
+        "max_chars": request.max_chars,
+        "sensitive_words": request.sensitive_words,
+        "remove_punctuation": request.remove_punctuation,
+        "text_format": request.text_format
+    }
+    return audio, kwargs, subtitle_settings
+
+
+async def run_transcription(request, device, cpu_threads=0, num_workers=1, audio=None, slot=None):
+    """
+    Transcribe (and optionally diarize) one file and return the result dict.
+    audio can be the already decoded samples of request.file_path. slot is
+    a semaphore held from inference on, the decoding before it does not wait.
+    """
+    audio, kwargs, subtitle_settings = await prepare_transcription(request, cpu_threads, num_workers, audio)
+    # Long jobs keep their progress, submitting them again after a crash resumes
+    checkpoint = await stage_scheduler.run("decode", open_checkpoint, audio, kwargs)
+
+    if slot is not None:
+        await slot.acquire()
+    # Counted in the backlog that deadline requests are planned against
+    planner_key = uuid.uuid4().hex
+    planner.start(planner_key, kwargs["predicted_seconds"])
+    # Speeds are only learned from jobs that ran alone with the default
+    # thread count (not batch items), working memory also only if they loaded nothing
+    alone = len(planner.running) == 1 and not cpu_threads
+    loads_before = model_cache.stats["loads"]
+    try:
+        with PeakMemory() as memory:
+            # Process audio (transcription and optionally diarization)
+            result = await process_audio(
+                audio,
+                kwargs,
+                device,
+                request.diarize,
+                request.diarize_speaker_count,
+                subtitle_settings,
+                checkpoint
+            )
+    finally:
+        planner.finish(planner_key)
+        if slot is not None:
+            slot.release()
+    alone = alone and len(planner.running) == 0
+    # Resumed jobs only timed the chunks they decoded themselves
+    if alone and not kwargs["fast_model"] and (checkpoint is None or not checkpoint.resumed):
+        planner.record(kwargs["model"], kwargs["planner_device"], kwargs["duration"], result.get("timings", {}),
+                       kwargs["profile"], kwargs["batch_size"])
+        if model_cache.stats["loads"] == loads_before:
+            planner.record_memory(kwargs["model"], kwargs["planner_device"], kwargs["duration"],
+                                  request.diarize, memory)
+    if checkpoint is not None:
+        checkpoints.remove(checkpoint)
+    if kwargs["schedule"] is not None:
+        result["schedule"] = kwargs["schedule"]
+    result["mark_in"] = request.mark_in
+    result["mark_out"] = request.mark_out
+    return result
+
+
 @app.post("/transcribe/")
 async def transcribe(request: TranscriptionRequest):
+    job_id_var.set(uuid.uuid4().hex[:8])
     try:
         start_time = time.time()
 
@@ -515,107 +1021,379 @@ async def transcribe(request: TranscriptionRequest):
                 detail="File not found."
             )
         else:
-            print(f"Processing file: {file_path}")
+            log.info(f"Processing file: {file_path}")
 
-        # Select device
-        if torch.cuda.is_available():
-            device = torch.device("cuda")
-        elif torch.backends.mps.is_available():
-            device = torch.device("mps")
-        else:
-            device = torch.device("cpu")
-
-        print(f"Using device: {device}")
-
-        if request.language == "en":
-            request.model = request.model + ".en"
-            task = "transcribe"
-        elif request.language == "de" and request.model == "large" and architecture == "x86":
-            # german model is exclusive to faster whisper (x86)
-            request.model = request.model + ".de"
-            task = request.task
-        else:
-            task = request.task
+        # torch may still be loading in the background, wait off the event loop
+        await asyncio.to_thread(load_subsystems)
+        device = select_device()
+        log.info(f"Using device: {device}")
 
-        # windows, or on mac with intel architecture
-        if architecture == "x86":
-            model = win_models[request.model]
-        else:
-            model = mac_models[request.model]
-
-        print(model)
-
-        kwargs = {
-            "model": model,
-            "task": task,
-            "language": request.language,
-            "align_words": request.align_words,
-            "device": "cuda" if torch.cuda.is_available() else "cpu"
-        }
-
-        subtitle_settings = {
-            "max_words": request.max_words,
-            "max_chars": request.max_chars,
-            "sensitive_words": request.sensitive_words,
-            "remove_punctuation": request.remove_punctuation,
-            "text_format": request.text_format
-        }
-
-        # Process audio (transcription and optionally diarization)
         try:
-            result = await process_audio(
-                file_path,
-                kwargs,
-                device,
-                request.diarize,
-                request.diarize_speaker_count,
-                subtitle_settings
-            )
-            result["mark_in"] = request.mark_in
-            result["mark_out"] = request.mark_out
+            result = await run_transcription(request, device)
+        except HTTPException:
+            raise
         except Exception as e:
-            print(f"Error during transcription: {e}")
+            log.exception(f"Error during transcription: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error during transcription: {e}"
             )
 
         # Save the transcription to a JSON file
-        json_filename = f"{request.timeline}.json"
-        json_filepath = os.path.join(request.output_dir, json_filename)
-        try:            
-            if not os.path.exists(request.output_dir):
-                os.makedirs(request.output_dir, exist_ok=True)
-
-            # Save the transcription to a JSON file
-            with open(json_filepath, 'w', encoding='utf-8') as f:
-                json.dump(sanitize_result(result), f, indent=4, ensure_ascii=False)
-
-            print(f"Transcription saved to: {json_filepath}")
+        try:
+            json_filepath = await stage_scheduler.run("write", save_result, result, request.output_dir, request.timeline)
         except Exception as e:
-            print(f"Error saving JSON file: {e}")
+            log.error(f"Error saving JSON file: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error saving JSON file: {e}"
             )
 
         end_time = time.time()
-        print(f"Transcription time: {end_time - start_time} seconds")
+        log.info(f"Transcription time: {end_time - start_time} seconds")
 
         # Return the path to the JSON file
-        return {"result_file": json_filepath}
+        response = {"result_file": json_filepath}
+        if "schedule" in result:
+            response["schedule"] = result["schedule"]
+        return response
 
     except HTTPException as http_exc:
         # Re-raise HTTP exceptions to be handled by FastAPI
         raise http_exc
     except Exception as e:
         # Catch any other unexpected exceptions
-        print(f"Unexpected error: {e}")
+        log.exception(f"Unexpected error: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Unexpected error: {e}"
         )
-    
+
+
+class BatchItem(BaseModel):
+    file_path: str
+    timeline: str
+    mark_in: int = 0
+    mark_out: int = 0
+    # Optional per-item overrides of the batch settings
+    model: Optional[str] = None
+    language: Optional[str] = None
+
+class BatchTranscriptionRequest(TranscriptionSettings):
+    items: List[BatchItem]
+    # Items transcribed at the same time (0 = derive from the core count)
+    max_concurrency: int = 0
+
+
+def batch_budget(model, requested, cpu_count):
+    """Items of one model to run at once, and the threads each of them gets."""
+    if architecture != "x86":
+        # MLX runs on the GPU, parallel items only contend for it
+        return 1, cpu_count
+    if requested > 0:
+        concurrency = max(1, min(requested, cpu_count))
+        return concurrency, max(1, cpu_count // concurrency)
+    import torch
+    tuned = calibration.get(model) if not torch.cuda.is_available() else None
+    if tuned is not None:
+        return tuned["num_workers"], tuned["worker_threads"]
+    # ctranslate2 scales well up to ~4 threads per decode, split the rest
+    concurrency = max(1, cpu_count // 4)
+    return concurrency, max(1, cpu_count // concurrency)
+
+
+@app.post("/transcribe_batch/")
+async def transcribe_batch(request: BatchTranscriptionRequest):
+    batch_id = uuid.uuid4().hex[:8]
+    job_id_var.set(batch_id)
+    start_time = time.time()
+    await asyncio.to_thread(load_subsystems)
+    device = select_device()
+    loads_before = model_cache.stats["loads"]
+    stages_since, busy_since = time.monotonic(), stage_scheduler.busy()
+
+    shared = request.model_dump(exclude={"items", "max_concurrency"})
+    results = [None] * len(request.items)
+    work = []
+    for index, item in enumerate(request.items):
+        item_settings = dict(shared, file_path=item.file_path, timeline=item.timeline,
+                             mark_in=item.mark_in, mark_out=item.mark_out)
+        if item.model is not None:
+            item_settings["model"] = item.model
+        if item.language is not None:
+            item_settings["language"] = item.language
+        item_request = TranscriptionRequest(**item_settings)
+
+        entry = {"timeline": item.timeline, "file_path": item.file_path}
+        if not os.path.exists(item.file_path):
+            results[index] = dict(entry, error="File not found.")
+            continue
+        try:
+            model, _ = resolve_model(item_request.model, item_request.language, item_request.task)
+        except KeyError:
+            results[index] = dict(entry, error=f"Unknown model: {item_request.model}")
+            continue
+        # ffprobe, off the event loop
+        duration = await asyncio.to_thread(get_audio_duration, item.file_path)
+        work.append((model, duration, index, item_request))
+
+    # Group items by model so each model is loaded once, longest files first
+    # so the short ones fill in the gaps at the end of each group
+    work.sort(key=lambda w: (w[0], -w[1], w[2]))
+
+    # the cores of this process, a share of the machine when pre-forked
+    cpu_count = cpu_budget.total
+    budgets = {}
+    log.info(f"Batch of {len(work)} items")
+
+    async def run_item(semaphore, concurrency, cpu_threads, model, duration, index, item_request):
+        # Only inference waits for the semaphore: the next items decode
+        # their audio while the current ones are transcribed
+        job_id_var.set(f"{batch_id}-{index}")
+        item_start = time.time()
+        entry = {"timeline": item_request.timeline, "file_path": item_request.file_path,
+                 "model": model, "duration": round(duration, 3)}
+        try:
+            result = await run_transcription(item_request, device, cpu_threads, concurrency, slot=semaphore)
+            entry["result_file"] = await stage_scheduler.run(
+                "write", save_result, result, item_request.output_dir, item_request.timeline)
+        except HTTPException as e:
+            entry["error"] = e.detail
+        except Exception as e:
+            log.exception(f"Error during transcription: {e}")
+            entry["error"] = str(e)
+        entry["elapsed"] = round(time.time() - item_start, 3)
+        results[index] = entry
+
+    for model, group in itertools.groupby(work, key=lambda w: w[0]):
+        concurrency, cpu_threads = batch_budget(model, request.max_concurrency, cpu_count)
+        budgets[model] = {"concurrency": concurrency, "cpu_threads": cpu_threads}
+        log.info(f"{model}: {concurrency} items at a time with {cpu_threads} threads each")
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(run_item(semaphore, concurrency, cpu_threads, *w) for w in group))
+
+    elapsed = time.time() - start_time
+    audio_seconds = sum(w[1] for w in work)
+    succeeded = [r for r in results if "result_file" in r]
+    stats = {
+        "items": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "models": sorted({w[0] for w in work}),
+        "model_loads": model_cache.stats["loads"] - loads_before,
+        "budgets": budgets,
+        "audio_seconds": round(audio_seconds, 3),
+        "elapsed": round(elapsed, 3),
+        "real_time_factor": round(elapsed / audio_seconds, 4) if audio_seconds else None,
+        "stage_utilization": stage_scheduler.utilization(stages_since, busy_since),
+    }
+    log.info(f"Batch complete: {stats['succeeded']}/{stats['items']} items in {elapsed:.1f} seconds")
+    return {"results": results, "stats": stats}
+
+# Small model for the draft of a progressive transcription
+default_draft_model = os.environ.get("AUTOSUBS_DRAFT_MODEL", "tiny")
+
+
+class ProgressiveTranscriptionRequest(TranscriptionRequest):
+    draft_model: str = default_draft_model
+
+
+def refine_ranges(segments, duration):
+    """
+    Time ranges covering the whole file, cut in the middle of the silences
+    between the chunks of draft segments, to refine one after the other.
+    """
+    chunks = silence_chunks(segments)
+    if not chunks:
+        return [(0.0, duration)]
+    cuts = [(a[-1]["end"] + b[0]["start"]) / 2 for a, b in zip(chunks, chunks[1:])]
+    edges = [0.0] + cuts + [duration]
+    return list(zip(edges, edges[1:]))
+
+
+def partial_result(request, segments, language, timings):
+    result = {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": language,
+        "speakers": [],
+        "timings": timings,
+        "mark_in": request.mark_in,
+        "mark_out": request.mark_out,
+    }
+    return result
+
+
+async def refine_transcription(job, request, device, audio, draft):
+    """Run the requested model range by range, replacing the draft segments as it goes."""
+    audio, kwargs, subtitle_settings = await prepare_transcription(request, audio=audio)
+    duration = len(audio) / 16000
+    start_time = time.time()
+
+    diarize_task = None
+    if request.diarize:
+        diarize_lease = cpu_budget.acquire("diarize", job_id_var.get(), elastic=True)
+        diarize_task = asyncio.ensure_future(stage_scheduler.run(
+            "diarize", diarize_audio, audio, device, request.diarize_speaker_count, diarize_lease))
+
+    segments = draft["segments"]
+    language = draft["language"]
+    try:
+        for start, end in refine_ranges(segments, duration):
+            part = await transcribe_stages(audio[int(start * 16000):int(end * 16000)], kwargs, subtitle_settings)
+            refined = shift_segments(part["segments"], start)
+            language = part["language"] or language
+            # Draft segments are replaced by whichever range holds their middle
+            segments = [s for s in segments if (s["start"] + s["end"]) / 2 < start] + refined + \
+                       [s for s in segments if (s["start"] + s["end"]) / 2 >= end]
+            for index, segment in enumerate(segments):
+                segment["id"] = index
+            timings = dict(draft["timings"], refine=round(time.time() - start_time, 3))
+            await stage_scheduler.run("write", save_result, partial_result(request, segments, language, timings),
+                                      request.output_dir, request.timeline)
+            job.update(refined_until=round(end, 3))
+            job.publish("segments", {"start": round(start, 3), "end": round(end, 3), "segments": refined})
+
+        result = partial_result(request, segments, language,
+                                dict(draft["timings"], refine=round(time.time() - start_time, 3)))
+        if diarize_task is not None:
+            diarization = await diarize_task
+            diarize_task = None
+            timings = result["timings"]
+            result = merge_diarisation(result, diarization)
+            result.update(timings=timings, mark_in=request.mark_in, mark_out=request.mark_out)
+        return result
+    finally:
+        if diarize_task is not None:
+            # Let the diarization thread finish on its own, it gives back its cores
+            diarize_task.add_done_callback(lambda task: task.exception())
+
+
+async def run_progressive(job, request):
+    """Draft with the small model first, then the requested model in the background."""
+    job_id_var.set(job.id[:8])
+    try:
+        start_time = time.time()
+        job.publish("started", status="drafting")
+        await asyncio.to_thread(load_subsystems)
+        device = select_device()
+        audio = None
+        if architecture == "x86":
+            audio = await stage_scheduler.run("decode", audio_cache.load, request.file_path)
+
+        # The draft only needs to be readable: no diarization, no word
+        # alignment, greedy decoding, and it does not count as model usage
+        draft_request = request.model_copy(update={
+            "model": request.draft_model, "diarize": False, "align_words": False, "profile": "fast",
+            "selective": False, "checkpoint": False})
+        draft_audio, draft_kwargs, subtitle_settings = await prepare_transcription(
+            draft_request, audio=audio, record_usage=False)
+        draft = await transcribe_stages(draft_audio, draft_kwargs, subtitle_settings)
+        draft["timings"] = {"draft": round(time.time() - start_time, 3)}
+        draft_result = partial_result(request, draft["segments"], draft["language"], draft["timings"])
+        result_file = await stage_scheduler.run("write", save_result, draft_result, request.output_dir, request.timeline)
+        job.update(result_file=result_file, draft_seconds=draft["timings"]["draft"])
+        log.info(f"Draft ready in {draft['timings']['draft']:.1f} seconds, refining with {request.model}")
+        job.publish("draft", {"result_file": result_file, "segments": draft["segments"]}, status="refining")
+
+        if architecture == "x86":
+            result = await refine_transcription(job, request, device, audio, draft)
+        else:
+            # mlx_whisper reads the file itself, refine it in one pass
+            result = await run_transcription(request, device)
+            result["timings"] = dict(result.get("timings", {}), **draft["timings"])
+        await stage_scheduler.run("write", save_result, result, request.output_dir, request.timeline)
+        job.update(total_seconds=round(time.time() - start_time, 3))
+        log.info(f"Refined transcription saved in {time.time() - start_time:.1f} seconds")
+        job.publish("done", {"result_file": result_file}, status="done")
+    except HTTPException as e:
+        job.fail(e.detail)
+    except Exception as e:
+        log.exception(f"Progressive transcription failed: {e}")
+        job.fail(e)
+
+
+@app.post("/transcribe/progressive/")
+async def transcribe_progressive(request: ProgressiveTranscriptionRequest):
+    """
+    Answer with a draft from a small model as soon as it is ready; the
+    requested model then refines the same result file in the background.
+    Follow it with GET /jobs/{id} or the /jobs/{id}/events stream.
+    """
+    if not os.path.exists(request.file_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found."
+        )
+    if request.draft_model not in win_models or "." in request.draft_model:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown draft model: {request.draft_model}"
+        )
+    if request.profile not in PROFILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown decoding profile: {request.profile}. Use one of: {', '.join(PROFILES)}"
+        )
+
+    job = jobs.create("progressive", model=request.model, draft_model=request.draft_model,
+                      file_path=request.file_path, result_file=None, refined_until=0.0)
+    job.task = asyncio.create_task(run_progressive(job, request))
+
+    index = 0
+    while job.status in ("queued", "drafting"):
+        index += len(await job.events_after(index))
+    if job.status == "failed":
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error during transcription: {job.error}"
+        )
+    return {"job_id": job.id, "status": job.status, "result_file": job.info["result_file"],
+            "events": f"/jobs/{job.id}/events"}
+
+
+@app.get("/jobs/")
+async def list_jobs():
+    return {"jobs": jobs.snapshots()}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    snapshot = jobs.status(job_id)
+    if snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found."
+        )
+    return snapshot
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """Server-sent events of a job: started, draft, segments (per refined range), done or error."""
+    job = jobs.get(job_id)
+    if job is None:
+        # Events live in the process running the job, a pre-forked sibling
+        # can only answer /jobs/{id}
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found in this worker, poll /jobs/{id} instead."
+        )
+    index = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+    async def stream():
+        nonlocal index
+        while True:
+            events = await job.events_after(index)
+            if not events:
+                break
+            for event in events:
+                data = json.dumps(sanitize_result(event["data"]), ensure_ascii=False)
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+            index += len(events)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
 # class SpeechSegmentsRequest(BaseModel):
 #     audio_file: str
 
@@ -641,6 +1419,223 @@ async def transcribe(request: TranscriptionRequest):
     
 #     return non_speech_timestamps
 
+@app.get("/ready/")
+async def ready():
+    """Which heavy libraries are loaded, requests before that wait for them."""
+    return {
+        "ready": all(seconds is not None for seconds in subsystems.values()),
+        "subsystems": {name: {"loaded": seconds is not None, "seconds": seconds}
+                       for name, seconds in subsystems.items()},
+        "uptime": round(time.time() - started_at, 3),
+    }
+
+
+@app.get("/models/")
+async def get_models():
+    """Resident models, how long each has been idle, the memory unloading freed and how often each was used."""
+    return {
+        "resident": model_cache.resident_models(),
+        "usage": model_usage.snapshot(),
+        "idle_timeout": model_cache.IDLE_TIMEOUT,
+        "rss_mb": model_cache.rss_mb(),
+        "available_mb": model_cache.available_mb(),
+        "stats": dict(model_cache.stats),
+        "recent_unloads": list(model_cache.recent_unloads),
+    }
+
+
+@app.post("/models/unload/")
+async def unload_models():
+    """Unload every model that no job is using right now."""
+    return await asyncio.to_thread(model_cache.unload)
+
+
+@app.get("/model_store/")
+async def get_model_store():
+    """Models in the local store, with the revision each was copied from."""
+    if model_store is None:
+        return {"enabled": False, "models": []}
+    return {"enabled": True, "models": await asyncio.to_thread(model_store.entries)}
+
+
+@app.get("/audio_cache/")
+async def get_audio_cache():
+    """Size of the decoded audio cache and how often it saved a decode."""
+    return await asyncio.to_thread(audio_cache.stats)
+
+
+@app.get("/cpu_budget/")
+async def get_cpu_budget():
+    """Current split of the cores between running stages."""
+    return cpu_budget.snapshot()
+
+
+@app.get("/stages/")
+async def get_stages():
+    """Pool size, queue and utilization of every pipeline stage."""
+    return stage_scheduler.snapshot()
+
+
+class PrefetchRequest(BaseModel):
+    model: str
+    language: str = "auto"
+    task: str = "transcribe"
+    diarize: bool = False
+
+
+@app.post("/prefetch/")
+async def prefetch(request: PrefetchRequest):
+    """
+    Start loading a model in the background, e.g. as soon as it is picked in
+    the app, so the load overlaps with the audio export.
+    """
+    try:
+        model_id, _ = resolve_model(request.model, request.language, request.task)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown model: {request.model}"
+        )
+
+    def run():
+        start = time.time()
+        try:
+            warm_model(model_id)
+            if request.diarize:
+                warm_diarization()
+            log.info(f"Prefetched {model_id} in {time.time() - start:.1f}s")
+        except Exception as e:
+            log.warning(f"Prefetch of {model_id} failed: {e}")
+
+    threading.Thread(target=run, name=f"prefetch-{model_id}", daemon=True).start()
+    return {"model": model_id, "diarize": request.diarize, "loading": True}
+
+
+class CalibrateRequest(BaseModel):
+    model: str = "small"
+
+
+@app.post("/calibrate/")
+async def calibrate(request: CalibrateRequest):
+    """Measure the fastest CPU settings for a model on this host and store them."""
+    if architecture != "x86":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Calibration only applies to faster-whisper (x86)."
+        )
+    if request.model not in win_models:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown model: {request.model}"
+        )
+    try:
+        await asyncio.to_thread(load_subsystems)
+        # Waits for the running transcriptions, and they wait for its trials
+        return await asyncio.to_thread(calibration.calibrate, win_models[request.model], budget=cpu_budget)
+    except Exception as e:
+        log.exception(f"Calibration failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Calibration failed: {e}"
+        )
+
+
+class EstimateRequest(BaseModel):
+    file_path: Optional[str] = None
+    duration: Optional[float] = None
+    model: str = "small"
+    language: str = "auto"
+    task: str = "transcribe"
+    diarize: bool = False
+    align_words: bool = False
+    profile: str = DEFAULT_PROFILE
+    batch_size: int = default_batch_size
+
+
+@app.post("/estimate/")
+async def estimate(request: EstimateRequest):
+    """
+    Predicted wall time and peak memory of a transcription on this host, from
+    the speeds and memory measured on earlier jobs (priors until then).
+    """
+    duration = request.duration
+    if duration is None:
+        if request.file_path is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Either duration or file_path is required."
+            )
+        if not os.path.exists(request.file_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="File not found."
+            )
+        duration = await asyncio.to_thread(get_audio_duration, request.file_path)
+        if not duration:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Could not read the duration of the file."
+            )
+    if duration < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Duration must not be negative."
+        )
+    try:
+        model, _ = resolve_model(request.model, request.language, request.task)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown model: {request.model}"
+        )
+    if request.profile not in PROFILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown decoding profile: {request.profile}. Use one of: {', '.join(PROFILES)}"
+        )
+
+    await asyncio.to_thread(load_subsystems)
+    if architecture == "x86":
+        import torch
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    else:
+        device = "mlx"
+    # Word alignment needs a known language, as in transcribe_audio
+    align_words = request.align_words and request.language != "auto"
+    resident = resident_for_planner()
+    stages = planner.predict(model, device, duration, request.diarize, align_words,
+                             resident=model in resident, size=request.model, profile=request.profile,
+                             batch_size=request.batch_size)
+    sources = {stage: planner.rtf(stage, "pyannote" if stage == "diarize" else model, device,
+                                  request.model, request.profile, request.batch_size)[1]
+               for stage in ("transcribe", "align", "diarize") if stage in stages}
+    if "load" in stages:
+        sources["load"] = planner.load_seconds(model, device)[1]
+    queue = planner.backlog()
+    memory = planner.memory(model, device, duration, request.diarize, resident,
+                            model_cache.rss_mb(), size=request.model)
+    peak = memory.pop("peak")
+    sources.update({f"memory_{part}": source for part, source in memory.pop("sources").items()})
+    return {
+        "model": model,
+        "device": device,
+        "profile": request.profile,
+        "duration": round(duration, 1),
+        "seconds": round(queue + stages.pop("total"), 1),
+        "queue_seconds": round(queue, 1),
+        "stages": {stage: round(seconds, 1) for stage, seconds in stages.items()},
+        "peak_memory_mb": peak,
+        "memory_mb": memory,
+        "sources": sources,
+    }
+
+
+@app.get("/job_stats/")
+async def get_job_stats():
+    """Measured speed, load time and memory of past jobs on this machine, which /estimate/ is based on."""
+    return planner.stats.snapshot()
+
+
 class ModifyRequest(BaseModel):
     file_path: str
     max_words: int
@@ -649,6 +1644,8 @@ class ModifyRequest(BaseModel):
 
 @app.post("/modify/")
 async def modify(request: ModifyRequest):
+    await asyncio.to_thread(load_subsystems)
+    import stable_whisper
     result = stable_whisper.WhisperResult(request.file_path)
     result.reset()
     result = modify_result(result, request.max_words, request.max_chars, request.sensitive_words)
@@ -661,10 +1658,23 @@ class ValidateRequest(BaseModel):
     token: str
 
 
-@app.post("/validate/")
-async def validate_model(request: ValidateRequest):
-    token = request.token
-    print(token)
+# /validate/ answers per token; a refusal is kept briefly so accepting the
+# model terms on the website shows up on the next try
+validation_cache = {}
+validation_ttl = {True: 3600.0, False: 60.0}
+diarization_models = ["pyannote/speaker-diarization-3.1", "pyannote/segmentation-3.0"]
+# The file of each repo diarization loads. The access probe of
+# is_model_accessible() downloads only config.yaml, which leaves a snapshot
+# directory behind without the weights.
+diarization_files = {
+    "pyannote/speaker-diarization-3.1": "config.yaml",
+    "pyannote/segmentation-3.0": "pytorch_model.bin",
+}
+
+
+async def check_hf_access(token):
+    await asyncio.to_thread(load_subsystems)
+    from huggingface_hub import HfFolder, login
     if token is None or token == "":
         # Check if token is cached
         token = HfFolder.get_token()
@@ -672,18 +1682,97 @@ async def validate_model(request: ValidateRequest):
             return {"isAvailable": False, "message": None}
     else:
         try:
-            login(token)
+            await asyncio.to_thread(login, token)
         except Exception as e:
             return {"isAvailable": False, "message": "Hugging Face token is incorrect or expired."}
 
-    required_models = ["pyannote/speaker-diarization-3.1",
-                       "pyannote/segmentation-3.0"]
-    if not is_model_accessible(required_models[0], token=token):
-        return {"isAvailable": False, "message": f"Please accept the terms for model '{required_models[0]}' and provide a valid Hugging Face access token."}
-    if not is_model_accessible(required_models[1], token=token):
-        return {"isAvailable": False, "message": f"Please accept the terms for model '{required_models[1]}' and provide a valid Hugging Face access token."}
+    # Both repos are probed at the same time
+    accessible = await asyncio.gather(
+        *(asyncio.to_thread(is_model_accessible, model_id, token) for model_id in diarization_models))
+    for model_id, ok in zip(diarization_models, accessible):
+        if not ok:
+            return {"isAvailable": False, "message": f"Please accept the terms for model '{model_id}' and provide a valid Hugging Face access token."}
 
     return {"isAvailable": True, "message": "All required models are available"}
 
+
+@app.post("/validate/")
+async def validate_model(request: ValidateRequest):
+    log.debug("Validating Hugging Face access")
+    # Everything diarization needs is on disk, no token or network required
+    if all(is_model_cached_locally(model_id, filename=diarization_files[model_id]) for model_id in diarization_models):
+        return {"isAvailable": True, "message": "All required models are available"}
+
+    cache_key = hashlib.sha256((request.token or "").encode("utf-8")).hexdigest()
+    cached = validation_cache.get(cache_key)
+    if cached is not None and time.monotonic() < cached[0]:
+        return cached[1]
+
+    response = await check_hf_access(request.token)
+    validation_cache[cache_key] = (time.monotonic() + validation_ttl[response["isAvailable"]], response)
+    return response
+
+# Pre-forked worker processes (POSIX, faster-whisper only), 1 = single process
+worker_count = int(os.environ.get("AUTOSUBS_WORKERS", "1"))
+
+
+def preload_models():
+    """
+    Runs once in the pre-fork parent, everything loaded here is shared
+    copy-on-write by the workers.
+
+    ctranslate2 models are not loaded here: their worker threads are created
+    with the model and do not exist in a forked child. The parent downloads
+    them and reads the weights into the page cache so every worker loads
+    them from memory. The pyannote pipeline is plain torch tensors and is
+    loaded and warmed here, with a single torch thread so no OpenMP pool
+    exists at fork time.
+    """
+    load_subsystems()
+    import torch
+    from faster_whisper.utils import download_model
+    torch.set_num_threads(1)
+
+    for name in os.environ.get("AUTOSUBS_PRELOAD", "small").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        model_id = win_models.get(name, name)
+        try:
+            if model_store is not None:
+                model_path = model_store.warm(model_id)
+            else:
+                model_path = download_model(model_id)
+                with open(os.path.join(model_path, "model.bin"), "rb") as f:
+                    while f.read(16 * 1024 * 1024):
+                        pass
+            log.info(f"Preloaded {name} weights from {model_path}")
+        except Exception as e:
+            log.warning(f"Could not preload {name}: {e}")
+
+    if os.environ.get("AUTOSUBS_PRELOAD_DIARIZATION", "1") != "0":
+        try:
+            pipeline = get_diarization_pipeline(torch.device("cpu"))
+            # One pass over silence initialises every lazily built module
+            pipeline({"waveform": torch.zeros(1, 16000 * 5), "sample_rate": 16000})
+            log.info("Preloaded diarization pipeline")
+        except Exception as e:
+            log.warning(f"Could not preload diarization pipeline: {e}")
+
+
+def init_worker(index):
+    import torch
+    # Each worker owns an equal share of the cores
+    cpu_budget.total = max(1, (os.cpu_count() or 1) // worker_count)
+    torch.set_num_threads(cpu_budget.total)
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="localhost", port=56001, log_level="info")
+    if worker_count > 1 and architecture == "x86" and prefork.supported():
+        log.info(f"Starting {worker_count} worker processes")
+        prefork.serve(app, "localhost", 56001, worker_count,
+                      preload=preload_models, init_worker=init_worker, log_level="info")
+    else:
+        if worker_count > 1:
+            log.warning("Worker processes need fork and faster-whisper, running a single process")
+        uvicorn.run(app, host="localhost", port=56001, log_level="info")
@@ -0,0 +1,101 @@
+"""
+Decoded audio shared between processes without copying it.
+
+The owner decodes a file once into a shared memory block and hands out
+AudioRef descriptors (block name, offset and length in samples). A worker
+attaches to the block and gets a numpy view of the samples, so the audio is
+never pickled. Audio that is already in the decoded audio cache is described
+by its .npy file instead and readers map the file.
+
+Only transcribe_cli.py hands audio to other processes this way. The server's
+stage and chunk workers are threads sharing the decoded array, and pre-forked
+server workers each decode the requests they receive.
+"""
+import atexit
+import sys
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+DTYPE = np.float32
+
+# kind "shm": name is a shared memory block, "file": name is a .npy file
+# (the decoded audio cache) that readers map instead
+AudioRef = namedtuple("AudioRef", ["name", "offset", "length", "sample_rate", "kind"], defaults=["shm"])
+
+# Blocks this process created (owned) or attached to, by name
+_owned = {}
+_attached = {}
+
+
+def share(samples, sample_rate=SAMPLE_RATE):
+    """Copy decoded samples into a new shared memory block owned by this process."""
+    samples = np.ascontiguousarray(samples, dtype=DTYPE)
+    block = shared_memory.SharedMemory(create=True, size=max(samples.nbytes, 1))
+    np.ndarray(samples.shape, dtype=DTYPE, buffer=block.buf)[:] = samples
+    _owned[block.name] = block
+    return AudioRef(block.name, 0, len(samples), sample_rate)
+
+
+def share_file(path, sample_rate=SAMPLE_RATE):
+    """Descriptor of samples already stored in a .npy file, nothing is copied."""
+    samples = np.load(path, mmap_mode="r")
+    return AudioRef(path, 0, len(samples), sample_rate, "file")
+
+
+def _open(name):
+    block = _owned.get(name) or _attached.get(name)
+    if block is not None:
+        return block
+    if sys.version_info >= (3, 13):
+        block = shared_memory.SharedMemory(name=name, track=False)
+    else:
+        # Before 3.13 attaching registers the block with the resource
+        # tracker, which then unlinks it when the worker exits; the owner
+        # is the only one that should do that
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            block = shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+    _attached[name] = block
+    return block
+
+
+def view(ref):
+    """Numpy view of the samples of ref. Readers must not modify it."""
+    if ref.kind == "file":
+        # Copy-on-write mapping, pages come from the shared page cache. A
+        # plain ndarray view of it: stable-ts rejects np.memmap inputs
+        samples = np.load(ref.name, mmap_mode="c")[ref.offset:ref.offset + ref.length]
+        return samples.view(np.ndarray)
+    block = _open(ref.name)
+    return np.ndarray((ref.length,), dtype=DTYPE, buffer=block.buf,
+                      offset=ref.offset * np.dtype(DTYPE).itemsize)
+
+
+def detach(name):
+    """Stop using a block in this process (views of it must be gone)."""
+    block = _attached.pop(name, None)
+    if block is not None:
+        block.close()
+
+
+def release(ref):
+    """Free a block created by share(), once no worker needs it anymore."""
+    block = _owned.pop(ref.name, None)
+    if block is not None:
+        block.close()
+        block.unlink()
+
+
+@atexit.register
+def _release_all():
+    # Blocks outlive the process unless unlinked, never leave any behind
+    for name in list(_owned):
+        block = _owned.pop(name)
+        block.close()
+        block.unlink()
@@ -0,0 +1,157 @@
+"""
+Bounded thread pools per pipeline stage, so the stages of different jobs
+overlap: job B decodes its audio and runs VAD while job A is in inference,
+instead of every job running decode, transcribe, align, diarize, merge and
+write as one block.
+
+Each stage has its own pool, sized to what the stage can use (one
+diarization at a time, the cores for inference, a couple of threads for
+ffmpeg and file writes). Work waits in the queue of its pool, not on a
+thread, so a long queue for one stage never starves the others.
+
+AUTOSUBS_STAGE_POOLS overrides the sizes, e.g. "decode=3,align=1".
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logger import get_logger
+
+log = get_logger("stages")
+
+STAGES = ("decode", "transcribe", "align", "diarize", "merge", "write")
+
+
+def default_sizes(cpu_count=None):
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return {
+        # ffmpeg runs in its own process, the thread mostly waits on it
+        "decode": 2,
+        # ctranslate2 splits the cores between the decodes (cpu_budget),
+        # a pool as large as the core count never holds back a batch
+        "transcribe": cpu_count,
+        "align": 2,
+        # pyannote takes the whole machine, and diarization_lock would
+        # serialize it anyway
+        "diarize": 1,
+        "merge": 2,
+        "write": 2,
+    }
+
+
+def parse_sizes(value):
+    """Pool sizes from "stage=n,stage=n"."""
+    sizes = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        stage, _, count = item.partition("=")
+        stage = stage.strip()
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage!r} in AUTOSUBS_STAGE_POOLS")
+        sizes[stage] = max(1, int(count))
+    return sizes
+
+
+class StageStats(object):
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        # start time of each call running now, for the busy time so far
+        self.active = {}
+
+
+class StageScheduler(object):
+    """A bounded pool per stage, with the time each one spent busy."""
+
+    def __init__(self, sizes=None):
+        self.sizes = default_sizes()
+        if sizes:
+            self.sizes.update(sizes)
+        self.pools = {stage: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"stage-{stage}")
+                      for stage, size in self.sizes.items()}
+        self.lock = threading.Lock()
+        self.stats = {stage: StageStats() for stage in self.sizes}
+        self.started = time.monotonic()
+        self.calls = 0
+
+    async def run(self, stage, fn, *args, **kwargs):
+        """Run fn in the pool of stage, waiting in its queue if the pool is full."""
+        stats = self.stats[stage]
+        submitted = time.monotonic()
+        with self.lock:
+            stats.submitted += 1
+            self.calls += 1
+            call_id = self.calls
+        # run_in_executor does not carry the context over (job ids in logs)
+        context = contextvars.copy_context()
+
+        def call():
+            start = time.monotonic()
+            with self.lock:
+                stats.running += 1
+                stats.wait_seconds += start - submitted
+                stats.active[call_id] = start
+            failed = True
+            try:
+                result = context.run(fn, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                with self.lock:
+                    stats.running -= 1
+                    stats.active.pop(call_id, None)
+                    stats.busy_seconds += time.monotonic() - start
+                    if failed:
+                        stats.failed += 1
+                    else:
+                        stats.completed += 1
+
+        return await asyncio.get_running_loop().run_in_executor(self.pools[stage], call)
+
+    def busy(self):
+        """Busy seconds of every stage so far, counting the calls still running."""
+        now = time.monotonic()
+        with self.lock:
+            return {stage: stats.busy_seconds + sum(now - start for start in stats.active.values())
+                    for stage, stats in self.stats.items()}
+
+    def utilization(self, since=None, busy_since=None):
+        """
+        Share of each pool's capacity that was busy since a time.monotonic()
+        value (the scheduler's start by default), and the busy seconds per
+        stage at that time, from an earlier busy() call.
+        """
+        since = self.started if since is None else since
+        elapsed = max(time.monotonic() - since, 1e-9)
+        busy = self.busy()
+        return {stage: round((busy[stage] - (busy_since or {}).get(stage, 0.0)) / (self.sizes[stage] * elapsed), 4)
+                for stage in busy}
+
+    def snapshot(self):
+        busy = self.busy()
+        utilization = self.utilization()
+        with self.lock:
+            return {
+                "uptime": round(time.monotonic() - self.started, 3),
+                "stages": {stage: {
+                    "workers": self.sizes[stage],
+                    "running": stats.running,
+                    "queued": stats.submitted - stats.completed - stats.failed - stats.running,
+                    "completed": stats.completed,
+                    "failed": stats.failed,
+                    "busy_seconds": round(busy[stage], 3),
+                    "mean_wait_seconds": round(stats.wait_seconds / (stats.completed + stats.failed), 3)
+                    if stats.completed + stats.failed else 0.0,
+                    "utilization": utilization[stage],
+                } for stage, stats in self.stats.items()},
+            }
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,319 @@
+"""
+Headless batch transcription without DaVinci Resolve or the AutoSubs app.
+
+    python transcribe_cli.py /path/to/audio --output-dir subs --model small --language en
+    python transcribe_cli.py manifest.jsonl --output-dir subs --workers 4 --diarize
+
+The input is either a directory (searched recursively for audio files) or a
+manifest (.json list or .jsonl lines) of objects with a "file_path" and
+optionally "timeline", "output_dir", "model" and "language". Results are
+written with the same JSON schema as the /transcribe/ endpoint.
+
+Progress is tracked in a state file in the output directory. Items whose
+output already exists for an unchanged source file and the same settings are
+skipped, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import shared_audio
+from audio import decode_audio
+from audio_cache import AudioCache
+from decoding import PROFILES, DEFAULT_PROFILE
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".aac", ".ogg", ".opus", ".mp4", ".mov", ".mkv")
+STATE_FILENAME = ".autosubs-batch.json"
+
+# Settings that change the output, used to decide if a previous result is reusable
+OUTPUT_SETTINGS = ("model", "language", "task", "diarize", "diarize_speaker_count", "align_words",
+                   "max_words", "max_chars", "sensitive_words", "remove_punctuation", "text_format",
+                   "batch_size", "profile")
+
+
+def find_audio_files(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def load_items(source, output_dir):
+    """Build the list of work items from a directory or a manifest file."""
+    items = []
+    if os.path.isdir(source):
+        for path in find_audio_files(source):
+            relative = os.path.relpath(path, source)
+            subdir, name = os.path.split(relative)
+            items.append({
+                "file_path": os.path.abspath(path),
+                "timeline": os.path.splitext(name)[0],
+                # Mirror the input layout so equal file names do not collide
+                "output_dir": os.path.join(output_dir, subdir),
+            })
+        return items
+
+    with open(source, "r", encoding="utf-8") as f:
+        if source.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = json.load(f)
+    base = os.path.dirname(os.path.abspath(source))
+    for entry in entries:
+        item = dict(entry)
+        item["file_path"] = os.path.join(base, entry["file_path"])
+        item.setdefault("timeline", os.path.splitext(os.path.basename(entry["file_path"]))[0])
+        item["output_dir"] = os.path.join(base, entry["output_dir"]) if "output_dir" in entry else output_dir
+        items.append(item)
+    return items
+
+
+def item_fingerprint(item, settings):
+    """Identifies the source file version and the settings used to produce an output."""
+    stat = os.stat(item["file_path"])
+    options = {key: item.get(key, settings[key]) for key in OUTPUT_SETTINGS}
+    digest = hashlib.sha1(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "settings": digest}
+
+
+def output_path(item):
+    return os.path.join(item["output_dir"], f"{item['timeline']}.json")
+
+
+class BatchState(object):
+    """Completed items of a run, persisted after every item so runs can resume."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.done = json.load(f).get("done", {})
+            except (OSError, ValueError):
+                self.done = {}
+
+    def is_done(self, item, fingerprint):
+        out = output_path(item)
+        return self.done.get(out) == fingerprint and os.path.exists(out)
+
+    def mark_done(self, item, fingerprint):
+        self.done[output_path(item)] = fingerprint
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"done": self.done}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+# ---------------------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------------------
+
+_worker_threads = 0
+
+
+def _init_worker(cpu_threads):
+    global _worker_threads
+    _worker_threads = cpu_threads
+    # Each worker has its own CPU budget and would find it idle between its
+    # items while the others transcribe: no calibration runs in the batch
+    os.environ["AUTOSUBS_AUTO_CALIBRATE"] = "0"
+    import server
+    # and each owns an equal share of the cores, as prefork workers do
+    server.cpu_budget.total = cpu_threads
+
+
+def process_item(item, settings, audio_ref):
+    """Run one item in a worker process; models stay loaded between items."""
+    import server
+    import shared_audio
+
+    request = server.TranscriptionRequest(**dict(
+        {key: item.get(key, value) for key, value in settings.items()},
+        file_path=item["file_path"],
+        timeline=item["timeline"],
+        output_dir=item["output_dir"],
+        mark_in=item.get("mark_in", 0),
+        mark_out=item.get("mark_out", 0),
+    ))
+    server.job_id_var.set(item["timeline"])
+    start = time.time()
+    # The parent decoded the file (audio cache or shared memory), read it in place
+    audio = shared_audio.view(audio_ref)
+    try:
+        result = asyncio.run(server.run_transcription(
+            request, server.select_device(), _worker_threads, 1, audio=audio))
+    finally:
+        del audio
+        shared_audio.detach(audio_ref.name)
+    path = server.save_result(result, request.output_dir, request.timeline)
+    return path, time.time() - start
+
+
+def default_cache_dir():
+    # Same location as the server uses
+    import appdirs
+    return appdirs.user_cache_dir("AutoSubs-Cache" if sys.platform == "win32" else "AutoSubs", "")
+
+
+def share_item(item, cache):
+    if cache is not None:
+        # Workers map the cached .npy file, nothing is copied. It stays pinned
+        # while the item waits for a worker, so decoding the next items
+        # cannot evict it first
+        path = cache.store(item["file_path"], pin=True)
+        try:
+            return shared_audio.share_file(path)
+        except Exception:
+            cache.unpin(path)
+            raise
+    return shared_audio.share(decode_audio(item["file_path"]))
+
+
+def release_item(audio_ref, cache):
+    if audio_ref.kind == "file":
+        cache.unpin(audio_ref.name)
+    else:
+        shared_audio.release(audio_ref)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoSubs headless batch transcription")
+    parser.add_argument("input", help="Directory of audio files or a .json/.jsonl manifest")
+    parser.add_argument("--output-dir", default="transcripts")
+    parser.add_argument("--model", default="small", help="tiny, base, small, medium or large")
+    parser.add_argument("--language", default="auto")
+    parser.add_argument("--task", default="transcribe", choices=["transcribe", "translate"])
+    parser.add_argument("--diarize", action="store_true")
+    parser.add_argument("--speakers", type=int, default=0, help="Number of speakers (0 = detect)")
+    parser.add_argument("--align-words", action="store_true")
+    parser.add_argument("--max-words", type=int, default=6)
+    parser.add_argument("--max-chars", type=int, default=40)
+    parser.add_argument("--sensitive-words", default="", help="Comma separated words to censor")
+    parser.add_argument("--remove-punctuation", action="store_true")
+    parser.add_argument("--text-format", default="none", choices=["none", "lowercase", "uppercase"])
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="Batched faster-whisper inference (0 = sequential)")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=list(PROFILES),
+                        help="Decoder settings, from fastest to most accurate")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel worker processes")
+    parser.add_argument("--force", action="store_true", help="Redo items that are already done")
+    parser.add_argument("--audio-cache-mb", type=int,
+                        default=int(os.environ.get("AUTOSUBS_AUDIO_CACHE_MB", "2048")),
+                        help="Size of the decoded audio cache (0 = decode every run)")
+    args = parser.parse_args()
+
+    settings = {
+        "model": args.model,
+        "language": args.language,
+        "task": args.task,
+        "diarize": args.diarize,
+        "diarize_speaker_count": args.speakers,
+        "align_words": args.align_words,
+        "max_words": args.max_words,
+        "max_chars": args.max_chars,
+        "sensitive_words": [w.strip() for w in args.sensitive_words.split(",") if w.strip()],
+        "remove_punctuation": args.remove_punctuation,
+        "text_format": args.text_format,
+        "batch_size": args.batch_size,
+        "profile": args.profile,
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    state = BatchState(os.path.join(args.output_dir, STATE_FILENAME))
+    items = load_items(args.input, args.output_dir)
+
+    pending = []
+    for item in items:
+        if not os.path.exists(item["file_path"]):
+            print(f"Missing input, skipping: {item['file_path']}")
+            continue
+        fingerprint = item_fingerprint(item, settings)
+        if not args.force and state.is_done(item, fingerprint):
+            continue
+        pending.append((item, fingerprint))
+
+    print(f"{len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to process")
+    if not pending:
+        return
+
+    cache = None
+    if args.audio_cache_mb > 0:
+        cache = AudioCache(os.path.join(default_cache_dir(), "audio_cache"), args.audio_cache_mb * 1024 * 1024)
+
+    workers = max(1, min(args.workers, len(pending)))
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+    failed = 0
+    done = 0
+    start = time.time()
+    # spawn keeps each worker's ctranslate2/torch thread pools independent
+    ctx = multiprocessing.get_context("spawn")
+    # Files are decoded here, a few ahead of the workers, into the audio
+    # cache (or shared memory) so only a small descriptor is sent to each worker
+    decoder = concurrent.futures.ThreadPoolExecutor(workers)
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                                                initargs=(cpu_threads,)) as executor:
+        queued = iter(pending)
+        decoding = {}
+        running = {}
+
+        def decode_next():
+            entry = next(queued, None)
+            if entry is not None:
+                decoding[decoder.submit(share_item, entry[0], cache)] = entry
+
+        for _ in range(workers * 2):
+            decode_next()
+        try:
+            while decoding or running:
+                finished, _ = concurrent.futures.wait(
+                    list(decoding) + list(running), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    if future in decoding:
+                        item, fingerprint = decoding.pop(future)
+                        try:
+                            audio_ref = future.result()
+                        except Exception as e:
+                            done += 1
+                            failed += 1
+                            print(f"[{done}/{len(pending)}] FAILED {item['file_path']}: could not decode: {e}")
+                            decode_next()
+                            continue
+                        running[executor.submit(process_item, item, settings, audio_ref)] = (item, fingerprint, audio_ref)
+                        continue
+
+                    item, fingerprint, audio_ref = running.pop(future)
+                    release_item(audio_ref, cache)
+                    decode_next()
+                    done += 1
+                    try:
+                        path, elapsed = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"[{done}/{len(pending)}] FAILED {item['file_path']}: {e}")
+                        continue
+                    state.mark_done(item, fingerprint)
+                    print(f"[{done}/{len(pending)}] {path} ({elapsed:.1f}s)")
+        except KeyboardInterrupt:
+            print("Interrupted, finished items are saved and will be skipped on the next run")
+            decoder.shutdown(wait=False, cancel_futures=True)
+            executor.shutdown(wait=False, cancel_futures=True)
+            for _, _, audio_ref in running.values():
+                release_item(audio_ref, cache)
+            sys.exit(130)
+    decoder.shutdown()
+
+    print(f"Done in {time.time() - start:.1f}s, {len(pending) - failed} succeeded, {failed} failed")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
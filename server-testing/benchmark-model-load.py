@@ -0,0 +1,150 @@
+"""
+Model load benchmark: faster-whisper loaded by name (hub lookup in hf_cache)
+against the local model store of the Transcription-Server.
+
+Every load runs in a fresh process and records the load time, the RSS the
+model added and the peak RSS of the process.
+
+    python benchmark-model-load.py
+    python benchmark-model-load.py --models small,large --compute-type int8 --runs 5
+    sudo python benchmark-model-load.py --drop-caches    # cold page cache (Linux)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+from benchmark import HERE, compare_reports, faster_whisper_models, peak_rss_mb, print_regressions, system_info, write_report
+
+SERVER_DIR = os.path.join(os.path.dirname(HERE), "Transcription-Server")
+DEFAULT_BASELINE = os.path.join(HERE, "model-load-baseline.json")
+
+
+def rss_mb():
+    sys.path.insert(0, SERVER_DIR)
+    from model_cache import rss_mb
+    return rss_mb()
+
+
+def _load(queue, source, model_name, store_dir, compute_type):
+    """Child process entry point: load one model and report back through the queue."""
+    try:
+        import stable_whisper
+        sys.path.insert(0, SERVER_DIR)
+        from model_store import ModelStore
+
+        resolve = 0.0
+        path = model_name
+        if source == "store":
+            start = time.perf_counter()
+            path = ModelStore(store_dir).path(model_name)
+            resolve = time.perf_counter() - start
+        before = rss_mb()
+        start = time.perf_counter()
+        model = stable_whisper.load_faster_whisper(path, device="cpu", compute_type=compute_type)
+        load = time.perf_counter() - start
+        after = rss_mb()
+        queue.put({"resolve": resolve, "load": load, "rss_added_mb": after - before, "peak_rss_mb": peak_rss_mb()})
+        del model
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_load(source, model_name, store_dir, compute_type, timeout):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_load, args=(queue, source, model_name, store_dir, compute_type))
+    process.start()
+    try:
+        outcome = queue.get(timeout=timeout)
+    except Exception:
+        outcome = {"error": "timed out"}
+    process.join(5)
+    if process.is_alive():
+        process.kill()
+    return outcome
+
+
+def drop_caches():
+    # Needs root; makes every load read the weights from disk
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoSubs model load benchmark")
+    parser.add_argument("--models", default="tiny,small", help="Comma separated model sizes")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per case")
+    parser.add_argument("--store-dir", help="Model store to use (default: a temporary one next to this script)")
+    parser.add_argument("--drop-caches", action="store_true", help="Drop the page cache before every load")
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--output", help="Report path (default: bench-reports/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Baseline report to compare against")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown/memory growth allowed against the baseline")
+    args = parser.parse_args()
+
+    store_dir = args.store_dir or os.path.join(HERE, "bench-model-store")
+    results = []
+    for size in args.models.split(","):
+        model_name = faster_whisper_models.get(size, size)
+        # First store use copies/links the model, keep that out of the timings
+        first = run_load("store", model_name, store_dir, args.compute_type, args.timeout)
+        if "error" in first:
+            print(f"{model_name}: {first['error']}")
+            continue
+        for source in ("hub", "store"):
+            runs = []
+            for n in range(args.runs):
+                if args.drop_caches:
+                    drop_caches()
+                outcome = run_load(source, model_name, store_dir, args.compute_type, args.timeout)
+                if "error" in outcome:
+                    print(f"{model_name} ({source}): {outcome['error']}")
+                    break
+                runs.append(outcome)
+            if not runs:
+                continue
+            result = {
+                "key": f"{model_name}/{source}/{args.compute_type}",
+                "model": model_name,
+                "source": source,
+                "runs": len(runs),
+                "resolve_seconds": round(statistics.median(r["resolve"] for r in runs), 4),
+                "load_seconds": round(statistics.median(r["load"] for r in runs), 4),
+                "rss_added_mb": round(statistics.median(r["rss_added_mb"] for r in runs), 1),
+                "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1),
+            }
+            results.append(result)
+            print(f"{model_name:>16} {source:>5}: load {result['load_seconds']:.3f}s "
+                  f"(+{result['resolve_seconds']:.3f}s resolve), +{result['rss_added_mb']:.0f}MB RSS, "
+                  f"peak {result['peak_rss_mb']:.0f}MB")
+
+    report = {"meta": dict(system_info(), compute_type=args.compute_type, drop_caches=args.drop_caches),
+              "results": results}
+    path = write_report(report, args.output, prefix="model-load")
+    print(f"Report saved to: {path}")
+    if args.update_baseline:
+        write_report(report, DEFAULT_BASELINE)
+        print(f"Baseline updated: {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, {
+            "load_seconds": ("relative", args.tolerance),
+            "rss_added_mb": ("relative", args.tolerance),
+        })
+        print_regressions(regressions)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Micro-benchmarks for transcript post-processing.
+
+Builds synthetic transcripts and diarizations (1k to 1M words by default) and
+times merge_diarisation(), modify_result() and sanitize_result() from the
+Transcription-Server, plus the SRT export path used by auto-subs.py
+(to_srt_vtt followed by adjust_subtitle_timestamps). Allocations are tracked
+with tracemalloc in a separate pass so they do not skew the timings.
+
+    python benchmark-postprocess.py
+    python benchmark-postprocess.py --sizes 1000,10000 --baseline postprocess-baseline.json
+
+The report is JSON with one record per function/size and a fitted scaling
+exponent per function; anything growing faster than --max-exponent (linear
+plus tolerance) is flagged and makes the script exit with status 1.
+"""
+import argparse
+import ast
+import datetime
+import gc
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmark import HERE, compare_reports, print_regressions, system_info, write_report
+
+SERVER_DIR = os.path.join(os.path.dirname(HERE), "Transcription-Server")
+sys.path.insert(0, SERVER_DIR)
+
+from postprocess import merge_diarisation, modify_result, sanitize_result  # noqa: E402
+import stable_whisper  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_BASELINE = os.path.join(HERE, "postprocess-baseline.json")
+WORDS = ["the", "quick", "brown", "fox", "jumps", "over", "a", "lazy", "dog", "darn",
+         "and", "then", "it", "said", "hello", "world", "again", "maybe", "not", "today"]
+SPEAKERS = ["SPEAKER_00", "SPEAKER_01", "SPEAKER_02", "SPEAKER_03"]
+
+
+def load_auto_subs_function(name):
+    """Pull a top-level function out of auto-subs.py without running the Resolve script."""
+    path = os.path.join(os.path.dirname(HERE), "auto-subs.py")
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    node = next(n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name == name)
+    namespace = {"re": re, "datetime": datetime.datetime, "timedelta": datetime.timedelta}
+    exec(compile(ast.Module(body=[node], type_ignores=[]), path, "exec"), namespace)
+    return namespace[name]
+
+
+adjust_subtitle_timestamps = load_auto_subs_function("adjust_subtitle_timestamps")
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def synthetic_transcript(word_count, words_per_segment=12):
+    """Transcript dict in the shape produced by WhisperResult.to_dict()."""
+    segments = []
+    t = 0.0
+    for first in range(0, word_count, words_per_segment):
+        words = []
+        for i in range(first, min(first + words_per_segment, word_count)):
+            token = WORDS[i % len(WORDS)]
+            # add punctuation regularly so the regrouping has work to do
+            if i % 7 == 6:
+                token += ","
+            elif i % 11 == 10:
+                token += "."
+            words.append({"word": " " + token, "start": round(t, 3), "end": round(t + 0.25, 3),
+                          "probability": 0.9})
+            t += 0.3
+        segments.append({
+            "start": words[0]["start"],
+            "end": words[-1]["end"],
+            "text": "".join(w["word"] for w in words),
+            "words": words,
+        })
+        # leave a pause between segments
+        t += 0.6
+    return {"text": "".join(s["text"] for s in segments), "language": "en", "segments": segments}
+
+
+class Turn:
+    __slots__ = ("start", "end")
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+class SyntheticDiarization:
+    """Minimal stand-in for pyannote's Annotation (only itertracks is used)."""
+
+    def __init__(self, transcript, segments_per_turn=3):
+        self.tracks = []
+        segments = transcript["segments"]
+        for n, first in enumerate(range(0, len(segments), segments_per_turn)):
+            group = segments[first:first + segments_per_turn]
+            self.tracks.append((Turn(group[0]["start"], group[-1]["end"]), n, SPEAKERS[n % len(SPEAKERS)]))
+
+    def itertracks(self, yield_label=False):
+        for turn, track, label in self.tracks:
+            yield (turn, track, label) if yield_label else (turn, track)
+
+
+# ---------------------------------------------------------------------------
+# Cases: each returns (setup, run); setup builds fresh input outside the timer
+# ---------------------------------------------------------------------------
+
+def case_merge_diarisation(transcript):
+    diarization = SyntheticDiarization(transcript)
+    return lambda: (transcript, diarization), lambda args: merge_diarisation(*args)
+
+
+def case_modify_result(transcript):
+    settings = {"max_words": 6, "max_chars": 40, "sensitive_words": ["darn", "Hello"],
+                "remove_punctuation": True, "text_format": "uppercase"}
+    return (lambda: stable_whisper.WhisperResult(transcript),
+            lambda result: modify_result(result, **settings))
+
+
+def case_sanitize_result(transcript):
+    return lambda: transcript, sanitize_result
+
+
+def case_srt(transcript):
+    tmp_dir = tempfile.mkdtemp(prefix="autosubs-bench-")
+    path = os.path.join(tmp_dir, "audio.srt")
+
+    def run(result):
+        result.to_srt_vtt(path, word_level=False)
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        content = adjust_subtitle_timestamps(content, datetime.timedelta(seconds=3600))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    return lambda: stable_whisper.WhisperResult(transcript), run
+
+
+cases = {
+    "merge_diarisation": case_merge_diarisation,
+    "modify_result": case_modify_result,
+    "sanitize_result": case_sanitize_result,
+    "srt": case_srt,
+}
+
+
+def measure(setup, run, repeats):
+    """Best-of-N wall time, then one tracemalloc pass for allocation stats."""
+    times = []
+    for _ in range(repeats):
+        args = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(args)
+        times.append(time.perf_counter() - start)
+        del args
+
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    run(args)
+    _, peak = tracemalloc.get_traced_memory()
+    retained = sum(stat.size for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    return min(times), peak, retained
+
+
+def scaling_exponent(points):
+    """Least-squares slope of log(time) against log(size)."""
+    points = [(math.log(n), math.log(t)) for n, t in points if t > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var if var else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoSubs post-processing micro-benchmarks")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma separated transcript sizes in words")
+    parser.add_argument("--cases", default=",".join(cases), help="Comma separated cases")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per size (best is kept)")
+    parser.add_argument("--max-exponent", type=float, default=1.2,
+                        help="Fail if time grows faster than size**max_exponent")
+    parser.add_argument("--output", help="Report path (default: bench-reports/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Baseline report to compare against")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown/allocation growth allowed against the baseline")
+    args = parser.parse_args()
+
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    selected = args.cases.split(",")
+
+    results, scaling = [], {}
+    for name in selected:
+        points = []
+        for size in sizes:
+            transcript = synthetic_transcript(size)
+            setup, run = cases[name](transcript)
+            seconds, peak, retained = measure(setup, run, args.repeats)
+            points.append((size, seconds))
+            results.append({
+                "key": f"{name}/{size}",
+                "case": name,
+                "words": size,
+                "seconds": round(seconds, 5),
+                "us_per_word": round(seconds / size * 1e6, 3),
+                "peak_alloc_mb": round(peak / 2**20, 3),
+                "retained_mb": round(retained / 2**20, 3),
+            })
+            print(f"{name:>18} {size:>9} words: {seconds:9.4f}s "
+                  f"({seconds / size * 1e6:7.2f} us/word) peak alloc {peak / 2**20:8.1f}MB")
+            del transcript, setup, run
+        exponent = scaling_exponent(points)
+        scaling[name] = None if exponent is None else round(exponent, 3)
+
+    nonlinear = {name: e for name, e in scaling.items() if e is not None and e > args.max_exponent}
+    for name, exponent in scaling.items():
+        flag = "  <-- super-linear" if name in nonlinear else ""
+        print(f"{name}: time ~ n^{exponent}{flag}")
+
+    report = {"meta": system_info(), "scaling": scaling, "results": results}
+    path = write_report(report, args.output, prefix="postprocess")
+    print(f"Report saved to: {path}")
+    if args.update_baseline:
+        write_report(report, DEFAULT_BASELINE)
+        print(f"Baseline updated: {DEFAULT_BASELINE}")
+
+    failed = bool(nonlinear)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, {
+            "seconds": ("relative", args.tolerance),
+            "peak_alloc_mb": ("relative", args.tolerance),
+        })
+        print_regressions(regressions)
+        failed = failed or bool(regressions)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Cold start benchmark for the Transcription-Server.
+
+Measures, over several fresh processes:
+  import          time to `import server` (what runs before uvicorn binds)
+  first_response  launch to the first 200 from GET /ready/
+  ready           launch until /ready/ reports every subsystem loaded
+
+    python benchmark-startup.py
+    python benchmark-startup.py --runs 10 --baseline startup-baseline.json
+    python benchmark-startup.py --command ../Transcription-Server/dist/transcription-server/transcription-server
+
+--command starts something other than `python server.py`, e.g. the frozen
+PyInstaller build, in which case only the launch timings are measured.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmark import HERE, compare_reports, print_regressions, system_info, write_report
+
+SERVER_DIR = os.path.join(os.path.dirname(HERE), "Transcription-Server")
+DEFAULT_BASELINE = os.path.join(HERE, "startup-baseline.json")
+READY_URL = "http://localhost:56001/ready/"
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import server; print(time.perf_counter() - start)"
+
+
+def measure_import():
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=SERVER_DIR,
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def poll_ready(timeout):
+    try:
+        with urllib.request.urlopen(READY_URL, timeout=timeout) as response:
+            return json.load(response)
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return None
+
+
+def measure_launch(command, timeout):
+    """Seconds until the first response and until ready, plus the last /ready/ payload."""
+    if poll_ready(0.5) is not None:
+        raise RuntimeError("Something is already listening on port 56001, stop it first")
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first_response = ready = status = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with {process.returncode}")
+            status = poll_ready(1.0)
+            if status is not None:
+                now = time.perf_counter() - start
+                if first_response is None:
+                    first_response = now
+                if status["ready"]:
+                    ready = now
+                    break
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return first_response, ready, status
+
+
+def summarize(key, values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"key": key, "runs": 0}
+    return {
+        "key": key,
+        "runs": len(values),
+        "seconds": round(statistics.median(values), 4),
+        "min": round(min(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoSubs server cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--command", help="Server command line (default: python server.py)")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for a launch")
+    parser.add_argument("--output", help="Report path (default: bench-reports/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Baseline report to compare against")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown allowed against the baseline")
+    args = parser.parse_args()
+
+    command = args.command.split() if args.command else [sys.executable, "server.py"]
+
+    imports = []
+    if not args.command:
+        for n in range(args.runs):
+            imports.append(measure_import())
+            print(f"import run {n + 1}: {imports[-1]:.3f}s")
+
+    first_responses, readies, subsystems = [], [], {}
+    for n in range(args.runs):
+        first_response, ready, status = measure_launch(command, args.timeout)
+        first_responses.append(first_response)
+        readies.append(ready)
+        if status is not None:
+            subsystems = status.get("subsystems", subsystems)
+        print(f"launch run {n + 1}: first response {first_response}s, ready {ready}s")
+
+    results = [summarize("first_response", first_responses), summarize("ready", readies)]
+    if imports:
+        results.insert(0, summarize("import", imports))
+    for result in results:
+        if result["runs"]:
+            print(f"{result['key']:>15}: {result['seconds']:.3f}s (min {result['min']:.3f}s, max {result['max']:.3f}s)")
+
+    report = {"meta": dict(system_info(), command=command), "subsystems": subsystems, "results": results}
+    path = write_report(report, args.output, prefix="startup")
+    print(f"Report saved to: {path}")
+    if args.update_baseline:
+        write_report(report, DEFAULT_BASELINE)
+        print(f"Baseline updated: {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, {"seconds": ("relative", args.tolerance)})
+        print_regressions(regressions)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
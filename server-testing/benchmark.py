@@ -0,0 +1,610 @@
+"""
+Transcription benchmark harness.
+
+Runs every available backend/model pair against the corpus described in
+corpus.json and records real-time factor, peak RSS, per-stage timings and
+word error rate against the reference transcripts. Each case runs in a fresh
+process so that peak RSS is not polluted by previously loaded models.
+
+    python benchmark.py --models tiny,small
+    python benchmark.py --backends faster-whisper --baseline benchmark-baseline.json
+    python benchmark.py --models small --update-baseline
+
+Backend options are passed through with --option, and --label keeps the
+variant apart in the report, e.g. batched faster-whisper against sequential:
+
+    python benchmark.py --backends faster-whisper --models small
+    python benchmark.py --backends faster-whisper --models small --option batch_size=8 --label batched
+
+The server's decoding profiles (Transcription-Server/decoding.py) run as
+variants of the faster-whisper and mlx backends, and the summary names the
+fastest profile whose WER stays within --wer-tolerance of "accurate":
+
+    python benchmark.py --backends faster-whisper --models small --profiles fast,balanced,accurate
+
+Corpus entries marked "expect_empty" (silence, noise) have no words to
+score. Any word emitted on them is a hallucination, and the run fails.
+
+Reports are written to bench-reports/ as JSON. When a baseline is given the
+report is compared against it and the process exits with status 1 if any case
+regressed beyond the configured tolerances.
+"""
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+import wave
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_RATE = 16000
+DEFAULT_CORPUS = os.path.join(HERE, "corpus.json")
+DEFAULT_BASELINE = os.path.join(HERE, "benchmark-baseline.json")
+REPORT_DIR = os.path.join(HERE, "bench-reports")
+SYNTHETIC_DIR = os.path.join(HERE, "bench-corpus")
+SERVER_DIR = os.path.join(os.path.dirname(HERE), "Transcription-Server")
+
+# Model names used by each backend for the sizes exposed in the app
+faster_whisper_models = {
+    "tiny": "tiny",
+    "base": "base",
+    "small": "small",
+    "medium": "medium",
+    "large": "large-v3-turbo",
+}
+
+mlx_models = {
+    "tiny": "mlx-community/whisper-tiny-mlx",
+    "base": "mlx-community/whisper-base-mlx-q4",
+    "small": "mlx-community/whisper-small-mlx",
+    "medium": "mlx-community/whisper-medium-mlx",
+    "large": "mlx-community/whisper-large-v3-turbo",
+}
+
+lightning_models = {
+    "tiny": "tiny",
+    "base": "base",
+    "small": "small",
+    "medium": "medium",
+    "large": "distil-large-v3",
+}
+
+
+# ---------------------------------------------------------------------------
+# Shared helpers (also used by the other benchmark scripts)
+# ---------------------------------------------------------------------------
+
+def peak_rss_mb():
+    """Peak resident set size of the current process in MiB (None if unknown)."""
+    try:
+        import resource
+    except ImportError:
+        # Windows has no resource module, fall back to psutil if installed
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except Exception:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB on Linux
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def system_info():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        revision = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "git_revision": revision,
+    }
+
+
+@contextlib.contextmanager
+def stage(stages, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def write_report(report, path=None, prefix="transcription"):
+    if path is None:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(REPORT_DIR, f"{prefix}-{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    return path
+
+
+def compare_reports(report, baseline, metrics):
+    """
+    Compare the results of two reports case by case.
+
+    `metrics` maps a metric name to (mode, tolerance) where mode is "relative"
+    (regression if value > baseline * (1 + tolerance)) or "absolute"
+    (regression if value > baseline + tolerance). Returns a list of
+    regressions, each a dict with the case key, metric and both values.
+    """
+    baseline_cases = {result["key"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report.get("results", []):
+        previous = baseline_cases.get(result["key"])
+        if previous is None:
+            continue
+        for metric, (mode, tolerance) in metrics.items():
+            value, reference = result.get(metric), previous.get(metric)
+            if value is None or reference is None:
+                continue
+            limit = reference * (1 + tolerance) if mode == "relative" else reference + tolerance
+            if value > limit:
+                regressions.append({
+                    "key": result["key"],
+                    "metric": metric,
+                    "baseline": reference,
+                    "current": value,
+                })
+    return regressions
+
+
+def print_regressions(regressions):
+    if not regressions:
+        print("No regressions against baseline.")
+        return
+    print(f"{len(regressions)} regression(s) against baseline:")
+    for r in regressions:
+        print(f"  {r['key']}: {r['metric']} {r['baseline']:.4g} -> {r['current']:.4g}")
+
+
+# ---------------------------------------------------------------------------
+# Word error rate
+# ---------------------------------------------------------------------------
+
+def normalize_words(text):
+    text = text.lower()
+    text = re.sub(r"[^\w\s']", " ", text)
+    return text.split()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance divided by the reference length."""
+    ref = normalize_words(reference)
+    hyp = normalize_words(hypothesis)
+    if not ref:
+        return None
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,                                # deletion
+                current[j - 1] + 1,                             # insertion
+                previous[j - 1] + (ref_word != hyp_word),       # substitution
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+def decode_audio(path):
+    """Decode any ffmpeg-readable file to 16 kHz mono float32."""
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", path,
+           "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+    out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(out, dtype=np.float32)
+
+
+def write_wav(path, audio):
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+
+
+def read_reference(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return json.load(f)["text"]
+        if path.endswith(".srt"):
+            lines = [l.strip() for l in f.read().splitlines()]
+            return " ".join(l for l in lines if l and not l.isdigit() and "-->" not in l)
+        return f.read()
+
+
+def build_synthetic(entry, entries_by_id):
+    """Generate (or reuse) the audio for a synthetic corpus entry."""
+    spec = entry["synthetic"]
+    os.makedirs(SYNTHETIC_DIR, exist_ok=True)
+    path = os.path.join(SYNTHETIC_DIR, f"{entry['id']}.wav")
+    reference = entry.get("reference_text", "")
+
+    if spec["kind"] == "repeat":
+        source = entries_by_id[spec["source"]]
+        reference = " ".join([source["reference_text"]] * spec["times"])
+        if not os.path.exists(path):
+            clip = decode_audio(source["audio"])
+            gap = np.zeros(int(spec.get("gap", 1.0) * SAMPLE_RATE), dtype=np.float32)
+            write_wav(path, np.concatenate([np.concatenate([clip, gap])] * spec["times"]))
+    elif not os.path.exists(path):
+        samples = int(spec["seconds"] * SAMPLE_RATE)
+        if spec["kind"] == "silence":
+            audio = np.zeros(samples, dtype=np.float32)
+        elif spec["kind"] == "noise":
+            rng = np.random.default_rng(spec.get("seed", 0))
+            audio = rng.standard_normal(samples).astype(np.float32) * spec.get("level", 0.02)
+        else:
+            raise ValueError(f"Unknown synthetic corpus kind: {spec['kind']}")
+        write_wav(path, audio)
+
+    return path, reference
+
+
+def load_corpus(path, only=None):
+    with open(path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    entries_by_id = {}
+    for entry in corpus["entries"]:
+        entry = dict(entry)
+        if "synthetic" in entry:
+            entry["audio"], entry["reference_text"] = build_synthetic(entry, entries_by_id)
+        else:
+            entry["audio"] = os.path.join(base, entry["audio"])
+            if "reference" in entry:
+                entry["reference_text"] = read_reference(os.path.join(base, entry["reference"]))
+        entry["duration"] = len(decode_audio(entry["audio"])) / SAMPLE_RATE
+        entries_by_id[entry["id"]] = entry
+    return [e for e in entries_by_id.values() if only is None or e["id"] in only]
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+def _device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def run_faster_whisper(model_name, audio, language, stages, options):
+    import stable_whisper
+    device = _device()
+    compute_type = "float16" if device == "cuda" else "int8"
+    with stage(stages, "load"):
+        model = stable_whisper.load_faster_whisper(
+            faster_whisper_models[model_name], device=device, compute_type=compute_type)
+    with stage(stages, "transcribe"):
+        result = model.transcribe_stable(
+            audio, language=language, regroup=True, verbose=None, vad_filter=True, **options)
+    with stage(stages, "postprocess"):
+        result.split_by_length(max_words=6)
+    return result.text
+
+
+def run_hf(model_name, audio, language, stages, options):
+    import stable_whisper
+    with stage(stages, "load"):
+        model = stable_whisper.load_hf_whisper(model_name, device=_device())
+    with stage(stages, "transcribe"):
+        result = model.transcribe(audio, language=language, vad=True)
+    with stage(stages, "postprocess"):
+        result.split_by_length(max_words=6)
+    return result.text
+
+
+def run_whisperx(model_name, audio, language, stages, options):
+    import stable_whisper
+    import whisperx
+    device = _device()
+    compute_type = "float16" if device == "cuda" else "int8"
+    with stage(stages, "load"):
+        model = whisperx.load_model(
+            faster_whisper_models[model_name], device, compute_type=compute_type, language=language)
+        align_model, metadata = whisperx.load_align_model(language_code=language, device=device)
+
+    def inference(audio_path, **kwargs):
+        samples = whisperx.load_audio(audio_path)
+        output = model.transcribe(samples, batch_size=16)
+        return whisperx.align(output["segments"], align_model, metadata, samples, device,
+                              return_char_alignments=False)
+
+    with stage(stages, "transcribe"):
+        result = stable_whisper.transcribe_any(inference, audio, vad=True)
+    with stage(stages, "postprocess"):
+        result.split_by_length(max_words=6)
+    return result.text
+
+
+def run_mlx(model_name, audio, language, stages, options):
+    import mlx.core as mx
+    import mlx_whisper
+    import stable_whisper
+    from mlx_whisper.transcribe import ModelHolder
+    repo = mlx_models[model_name]
+    with stage(stages, "load"):
+        # mlx_whisper keeps the last model in ModelHolder, so loading it here
+        # keeps the load cost out of the transcription stage
+        ModelHolder.get_model(repo, mx.float16)
+
+    def inference(audio_path, **kwargs):
+        return mlx_whisper.transcribe(
+            audio_path, path_or_hf_repo=repo, word_timestamps=True, language=language, verbose=None, **options)
+
+    with stage(stages, "transcribe"):
+        result = stable_whisper.transcribe_any(inference, audio, vad=False, regroup=True)
+    with stage(stages, "postprocess"):
+        result.split_by_length(max_words=6)
+    return result.text
+
+
+def run_lightning_mlx(model_name, audio, language, stages, options):
+    from lightning_whisper_mlx import LightningWhisperMLX
+    with stage(stages, "load"):
+        whisper = LightningWhisperMLX(model=lightning_models[model_name], batch_size=12, quant=None)
+    with stage(stages, "transcribe"):
+        result = whisper.transcribe(audio_path=audio, language=language)
+    return result["text"]
+
+
+backends = {
+    "faster-whisper": ("faster_whisper", run_faster_whisper),
+    "hf": ("transformers", run_hf),
+    "whisperx": ("whisperx", run_whisperx),
+    "mlx": ("mlx_whisper", run_mlx),
+    "lightning-mlx": ("lightning_whisper_mlx", run_lightning_mlx),
+}
+
+
+def available_backends():
+    return [name for name, (module, _) in backends.items()
+            if importlib.util.find_spec(module) is not None
+            and importlib.util.find_spec("stable_whisper") is not None]
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def _run_case(queue, backend, model_name, audio, language, options):
+    """Child process entry point: run one case and report back through the queue."""
+    stages = {}
+    try:
+        runner = backends[backend][1]
+        with stage(stages, "total"):
+            text = runner(model_name, audio, language, stages, options)
+        queue.put({"text": text, "stages": stages, "peak_rss_mb": peak_rss_mb()})
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}", "stages": stages, "peak_rss_mb": peak_rss_mb()})
+
+
+def run_case(backend, model_name, entry, options=None, timeout=None):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(
+        queue, backend, model_name, entry["audio"], entry.get("language"), options or {}))
+    process.start()
+    try:
+        outcome = queue.get(timeout=timeout)
+    except Exception:
+        outcome = {"error": "timed out", "stages": {}, "peak_rss_mb": None}
+    process.join(5)
+    if process.is_alive():
+        process.kill()
+    return outcome
+
+
+def summarize_runs(backend, model_name, entry, runs, label=None):
+    """Collapse repeated runs of one case into a single result record (medians)."""
+    errors = [r["error"] for r in runs if "error" in r]
+    runs = [r for r in runs if "error" not in r]
+    key = "/".join([backend if label is None else f"{backend}[{label}]", model_name, entry["id"]])
+    record = {"key": key, "backend": backend, "model": model_name, "corpus": entry["id"],
+              "duration": round(entry["duration"], 3)}
+    if label is not None:
+        record["variant"] = label
+    if not runs:
+        record["error"] = errors[0] if errors else "no runs"
+        return record
+
+    stage_names = sorted({name for r in runs for name in r["stages"]})
+    stages = {name: statistics.median(r["stages"].get(name, 0.0) for r in runs) for name in stage_names}
+    processing = stages.get("total", 0.0) - stages.get("load", 0.0)
+    reference = entry.get("reference_text")
+    text = runs[-1]["text"]
+    record.update({
+        "stages": {name: round(t, 4) for name, t in stages.items()},
+        # Real-time factor excludes model loading, which is reported separately
+        "rtf": round(processing / entry["duration"], 5) if entry["duration"] else None,
+        "peak_rss_mb": max((r["peak_rss_mb"] or 0) for r in runs) or None,
+        "wer": round(word_error_rate(reference, text), 4) if reference else None,
+        "hypothesis_words": len(normalize_words(text)),
+        "runs": len(runs),
+    })
+    if entry.get("expect_empty"):
+        # Nothing was said, every emitted word is made up (in any of the runs)
+        record["expect_empty"] = True
+        record["hallucinated_words"] = max(len(normalize_words(r["text"])) for r in runs)
+    if errors:
+        record["errors"] = errors
+    return record
+
+
+# Backends that take the server's decoding profiles
+profile_backends = {"faster-whisper": "faster-whisper", "mlx": "mlx"}
+
+
+def profile_options(name, backend):
+    sys.path.insert(0, SERVER_DIR)
+    from decoding import profile_options
+    return profile_options(name, backend=profile_backends[backend])
+
+
+def summarize_profiles(results, wer_tolerance):
+    """
+    Mean RTF and WER of every profile per backend/model, and the fastest
+    profile whose WER is within wer_tolerance of the most accurate one.
+    """
+    summary = {}
+    for record in results:
+        if "profile" not in record or "error" in record:
+            continue
+        group = summary.setdefault(f"{record['backend']}/{record['model']}", {})
+        entry = group.setdefault(record["profile"], {"rtf": [], "wer": []})
+        entry["rtf"].append(record["rtf"])
+        if record["wer"] is not None:
+            entry["wer"].append(record["wer"])
+
+    for key, group in summary.items():
+        for entry in group.values():
+            entry["rtf"] = round(statistics.mean(entry["rtf"]), 5)
+            entry["wer"] = round(statistics.mean(entry["wer"]), 4) if entry["wer"] else None
+        scored = {name: e for name, e in group.items() if e["wer"] is not None}
+        if not scored:
+            continue
+        reference = scored["accurate"]["wer"] if "accurate" in scored else min(e["wer"] for e in scored.values())
+        eligible = [name for name, e in scored.items() if e["wer"] <= reference + wer_tolerance]
+        group["recommended"] = min(eligible, key=lambda name: scored[name]["rtf"])
+    return summary
+
+
+def parse_variants(values):
+    """Parse --option key=value pairs (JSON values) into backend keyword arguments."""
+    options = {}
+    for value in values or []:
+        key, _, raw = value.partition("=")
+        try:
+            options[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            options[key] = raw
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoSubs transcription benchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--entries", help="Comma separated corpus ids (default: all)")
+    parser.add_argument("--backends", help="Comma separated backends (default: all available)")
+    parser.add_argument("--models", default="tiny,small", help="Comma separated model sizes")
+    parser.add_argument("--option", action="append",
+                        help="Extra key=value passed to the backend (e.g. batch_size=8)")
+    parser.add_argument("--label", help="Name for this variant of the backend (used in case keys)")
+    parser.add_argument("--profiles", help="Comma separated decoding profiles to run as variants "
+                                           "(faster-whisper and mlx backends)")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per case (medians are reported)")
+    parser.add_argument("--timeout", type=float, default=3600, help="Per-run timeout in seconds")
+    parser.add_argument("--output", help="Report path (default: bench-reports/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Baseline report to compare against")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help=f"Store this report as the baseline ({os.path.basename(DEFAULT_BASELINE)})")
+    parser.add_argument("--rtf-tolerance", type=float, default=0.15)
+    parser.add_argument("--rss-tolerance", type=float, default=0.15)
+    parser.add_argument("--wer-tolerance", type=float, default=0.02)
+    args = parser.parse_args()
+
+    only = set(args.entries.split(",")) if args.entries else None
+    corpus = load_corpus(args.corpus, only)
+    selected = args.backends.split(",") if args.backends else available_backends()
+    missing = [b for b in selected if b not in backends]
+    if missing:
+        parser.error(f"Unknown backend(s): {', '.join(missing)}")
+    models = args.models.split(",")
+    options = parse_variants(args.option)
+
+    print(f"Backends: {', '.join(selected) or 'none available'}")
+    print(f"Corpus: {', '.join(e['id'] for e in corpus)}")
+
+    profiles = args.profiles.split(",") if args.profiles else []
+
+    results = []
+    for backend in selected:
+        if profiles and backend not in profile_backends:
+            print(f"{backend}: no decoding profiles, skipped")
+            continue
+        # (label, profile, options) per variant of this backend
+        variants = [(args.label, None, options)]
+        if profiles:
+            variants = [(p if args.label is None else f"{args.label}-{p}", p,
+                         dict(options, **profile_options(p, backend))) for p in profiles]
+        for model_name in models:
+            for label, profile, variant_options in variants:
+                for entry in corpus:
+                    runs = [run_case(backend, model_name, entry, variant_options, args.timeout)
+                            for _ in range(args.runs)]
+                    record = summarize_runs(backend, model_name, entry, runs, label)
+                    if profile is not None:
+                        record["profile"] = profile
+                    results.append(record)
+                    if "error" in record:
+                        print(f"{record['key']}: ERROR {record['error']}")
+                    else:
+                        wer = "n/a" if record["wer"] is None else f"{record['wer']:.3f}"
+                        if record.get("expect_empty"):
+                            wer = f"{record['hallucinated_words']} hallucinated words"
+                        print(f"{record['key']}: rtf={record['rtf']:.3f} wer={wer} "
+                              f"peak_rss={record['peak_rss_mb'] or 0:.0f}MB stages={record['stages']}")
+
+    report = {"meta": dict(system_info(), options=options), "results": results}
+    if profiles:
+        report["profiles"] = summarize_profiles(results, args.wer_tolerance)
+        for key, group in report["profiles"].items():
+            for name in profiles:
+                if name in group:
+                    wer = "n/a" if group[name]["wer"] is None else f"{group[name]['wer']:.3f}"
+                    print(f"{key} [{name}]: mean rtf={group[name]['rtf']:.3f} mean wer={wer}")
+            if "recommended" in group:
+                print(f"{key}: recommended default profile: {group['recommended']}")
+    path = write_report(report, args.output)
+    print(f"Report saved to: {path}")
+
+    if args.update_baseline:
+        write_report(report, DEFAULT_BASELINE)
+        print(f"Baseline updated: {DEFAULT_BASELINE}")
+
+    hallucinations = [r for r in results if r.get("hallucinated_words")]
+    for record in hallucinations:
+        print(f"{record['key']}: {record['hallucinated_words']} words on audio that should give none")
+
+    regressions = []
+    baseline_path = args.baseline or (DEFAULT_BASELINE if os.path.exists(DEFAULT_BASELINE)
+                                      and not args.update_baseline else None)
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, {
+            "rtf": ("relative", args.rtf_tolerance),
+            "peak_rss_mb": ("relative", args.rss_tolerance),
+            "wer": ("absolute", args.wer_tolerance),
+        })
+        print_regressions(regressions)
+    if regressions or hallucinations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Core split of the Transcription-Server's CpuBudget between transcription
+(fixed lease) and diarization (elastic lease).
+
+    python -m pytest test_cpu_budget.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Transcription-Server"))
+
+from cpu_budget import CpuBudget
+
+
+def test_lone_transcription_takes_every_core():
+    budget = CpuBudget(8)
+    with budget.lease("transcribe") as lease:
+        assert lease.threads == 8
+
+
+def test_transcription_and_diarization_share_the_cores():
+    budget = CpuBudget(8)
+    # The order of process_audio: diarization registers first
+    diarize = budget.acquire("diarize", elastic=True)
+    transcribe = budget.acquire("transcribe")
+    assert transcribe.threads > 1
+    assert diarize.threads > 1
+    assert transcribe.threads + diarize.threads <= 8
+    budget.release(transcribe)
+    assert diarize.threads == 8
+    budget.release(diarize)
+
+
+def test_sized_lease_keeps_its_count():
+    budget = CpuBudget(8)
+    diarize = budget.acquire("diarize", elastic=True)
+    with budget.lease("transcribe", desired=6) as lease:
+        assert lease.threads == 6
+        assert diarize.threads == 2
+    budget.release(diarize)